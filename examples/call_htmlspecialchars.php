@@ -1,7 +1,7 @@
 <?php
 
 /*
- * Read a string from the input.pipe.txt file and pass it through the
+ * Read a string from the standard input and pass it through the
  * htmlspecialchars function. When this function is called with the
  * double_encode, i.e. the last, argument set to false, it will not reencode
  * html entities which are already encoded, such as &amp;.
@@ -11,8 +11,8 @@
  * This script is called from the php_idempotent.py file which infers a model of
  * the encoder.
  */
-$file='./input.pipe.txt';
-$s = htmlspecialchars(file_get_contents($file), ENT_NOQUOTES, "UTF-8", false);
+$s = htmlspecialchars(file_get_contents('php://stdin'), ENT_NOQUOTES, "UTF-8",
+                      false);
 echo $s
 
 ?>
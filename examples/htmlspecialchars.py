@@ -11,13 +11,13 @@ paths has to be added in the corresponding transducer.
 import argparse
 import random
 import subprocess
+import threading
 
 # Importing from ./context.py is performed to avoid assumptions on the location
 # of the library on the system. If library is installed then `import sflearn`
 # can be used.
-from context import BekProgram, TransducerLearner
+from context import BekProgram, TransducerLearner, ThreadPoolExecutor
 
-PHP_INPUT_FILE = 'input.pipe.txt'
 PHP_ENCODER_FILE = './call_htmlspecialchars.php'
 
 class HTMLSpecialCharsLearner(TransducerLearner):
@@ -25,40 +25,35 @@ class HTMLSpecialCharsLearner(TransducerLearner):
     The class implements a simple IPC in order to communicate with the PHP
     script executing the calls to the htmlspecialchars() function.
     """
-    def __init__(self, I):
+    def __init__(self, I, executor=None):
 
-        super(HTMLSpecialCharsLearner, self).__init__(I)
-        self.query_cache = {}
+        super(HTMLSpecialCharsLearner, self).__init__(I, executor=executor)
         self.total_membership_queries = 0
         self.total_equiv_queries = 0
-        self.total_cached_queries = 0
+        self._lock = threading.Lock()
 
 
     def membership_query(self, inp):
         """
-        The input from a membership query is written into a file which is then
-        read by the PHP script. The output of the htmlspecialchars() function
-        is then written into stdout from where it is read into the python
-        script.
-
-        This class also implements a query cache to avoid making expensive calls
-        IPC operations during membership queries.
+        The input from a membership query is written into the stdin of the
+        PHP script. The output of the htmlspecialchars() function is then
+        written into stdout from where it is read into the python script.
+        Every query runs its own PHP process, so queries can be answered in
+        parallel by the executor of the learner.
+
+        Repeated queries are answered by the query cache of the learner, so
+        this method is only called for the queries that reach the PHP script.
         """
 
-        self.total_membership_queries += 1
-
-        if tuple(inp) in self.query_cache:
-            self.total_cached_queries += 1
-            return self.query_cache[tuple(inp)]
+        with self._lock:
+            self.total_membership_queries += 1
 
         inp_enc = [chr(c) for c in inp]
-        with open(PHP_INPUT_FILE, 'w') as php_input_file:
-            php_input_file.write(''.join(inp_enc))
         proc = subprocess.Popen("php {}".format(PHP_ENCODER_FILE),
-                                shell=True, stdout=subprocess.PIPE)
-        out = proc.stdout.read()
+                                shell=True, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE)
+        out, _ = proc.communicate(''.join(inp_enc))
         dec_out = [ord(c) for c in out]
-        self.query_cache[tuple(inp)] = dec_out
         return dec_out
 
 
@@ -83,7 +78,7 @@ class HTMLSpecialCharsLearner(TransducerLearner):
                     vector = random.choice(tests)
                     inp += [ord(c) for c in vector]
 
-            if M.consume_input(inp) != self.membership_query(inp):
+            if M.consume_input(inp) != self.cached_membership_query(inp):
                 return False, inp
         return True, None
 
@@ -92,8 +87,8 @@ class HTMLSpecialCharsLearner(TransducerLearner):
         """
         Return the statistics for the number of queries performed.
         """
-        return (self.total_membership_queries, self.total_equiv_queries,\
-                self.total_cached_queries)
+        return (self.total_membership_queries + self.query_cache.hits,
+                self.total_equiv_queries, self.query_cache.hits)
 
 
 def _create_argument_parser():
@@ -102,6 +97,8 @@ def _create_argument_parser():
                         help="Filename to save the transducer")
     parser.add_argument("--bek", default=False, action="store_true", dest="save_bek",
                         help="Save transducer in BEK program format")
+    parser.add_argument("-j", "--workers", default=1, type=int, dest="workers",
+                        help="Number of membership queries to run in parallel")
     return parser
 
 
@@ -110,9 +107,12 @@ def main():
     args = parser.parse_args()
 
     I = [ord(c) for c in set([x for x in '&amp&lt;&gt;<>abcd'])]
-    htmlspecialchars_learner = HTMLSpecialCharsLearner(I)
+    executor = ThreadPoolExecutor(args.workers) if args.workers > 1 else None
+    htmlspecialchars_learner = HTMLSpecialCharsLearner(I, executor)
     print '[+] Learning PHP htmlspecialchars() function: ',
     htmlspecialchars = htmlspecialchars_learner.learn_transducer()
+    if executor is not None:
+        executor.close()
     print 'OK'
 
 
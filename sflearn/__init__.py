@@ -1,8 +1,24 @@
 #!/usr/bin/env python
 
 from transducer import Transducer,EPSILON
+from compact import CompactTransducer
+from binary import MappedTransducer, save_binary, load_binary
 from bek import BekProgram
-from angluin_fst import MealyMachineLearner,CE_RS, CE_SG
+from operations import minimize, equivalent, compose
+from codegen import PythonProgram
+from query_cache import QueryCache
+from executors import ThreadPoolExecutor, ProcessPoolExecutor
+from angluin_fst import MealyMachineLearner, CE_RS, CE_SG, CE_ES, CE_LS
 from angluin_fst_lookahead import TransducerLearner
+from dtree_fst import DiscriminationTreeLearner
+from async_learners import AsyncMealyMachineLearner, AsyncTransducerLearner
+from oracles import RandomWalkOracle, WMethodOracle, WpMethodOracle, \
+    RandomWpMethodOracle
 
-__all__ = ['Transducer', 'BekProgram', 'MealyMachineLearner', 'TransducerLearner']
+__all__ = ['Transducer', 'CompactTransducer', 'MappedTransducer',
+           'BekProgram', 'PythonProgram', 'MealyMachineLearner',
+           'TransducerLearner', 'QueryCache', 'ThreadPoolExecutor',
+           'ProcessPoolExecutor', 'AsyncMealyMachineLearner',
+           'AsyncTransducerLearner', 'DiscriminationTreeLearner',
+           'RandomWalkOracle', 'WMethodOracle', 'WpMethodOracle',
+           'RandomWpMethodOracle']
@@ -12,85 +12,15 @@ import logging
 
 from itertools import product
 from os.path import commonprefix
-from transducer import Transducer, EPSILON
+from observation_table import _common_prefix_length, _ObservationTable, \
+    _ObservationTableLearner
 
 CE_SG = 0
 CE_RS = 1
+CE_ES = 2
+CE_LS = 3
 
-class _ObservationTable(object):
-
-    """
-    This class implements the observation table data structure used by the
-    L* algorithm.
-    """
-
-    def __init__(self, I):
-        """
-        Args:
-            I (list): input alphabet
-        """
-        self.ot = {}
-        self.access_strings = []
-        self.transitions = []
-        self.dist_strings = list(I)
-        self.equiv_classes = {}
-
-    def is_closed(self):
-        """
-        Check if the observation table is closed.
-
-        Returns:
-            tuple(bool, str): True,None if table is closed, otherwise False,s
-            is returned where s is an escaping string.
-        """
-        for trans in self.transitions:
-            found = False
-            for acc_str in self.access_strings:
-                if self.ot[acc_str] == self.ot[trans]:
-                    self.equiv_classes[trans] = acc_str
-                    found = True
-                    break
-            if not found:
-                logging.debug('Transition {} is escaping'.format(trans))
-                return False, trans
-        return True, None
-
-
-    def __getitem__(self, key):
-        """
-        Return the requested entry from the observation table.
-
-        Args:
-            key (tuple(tuple(int),tuple(int))): A tuple containing the row
-            and column of the table respectively, where rows and columns are
-            also encoded as tuples of integers.
-
-        Returns:
-            list: The entry of the table at the requested position.
-        """
-        row, col = key
-        try:
-            return self.ot[row][col]
-        except KeyError:
-            return None
-
-    def __setitem__(self, key, value):
-        """
-        Sets the position of the table specified by key at value.
-
-        Args:
-            key (tuple(tuple(int),tuple(int))): A tuple containing the row
-            and column of the table respectively, where rows and columns are
-            also encoded as tuples of integers.
-            value (list): The value to set the table entry.
-        """
-        row, col = key
-        if row not in self.ot:
-            self.ot[row] = {}
-        self.ot[row][col] = value
-
-
-class MealyMachineLearner(object):
+class MealyMachineLearner(_ObservationTableLearner):
     """
     L* Algorithm adapted for inferring mealy machines with epsilon-transitions.
 
@@ -110,23 +40,51 @@ class MealyMachineLearner(object):
     The class supports two counterexample processing methods, Shabaz-Groz (SG)
     counterexample processing and the adapted Rivest-Schapire (RS) method. By
     default, RS is used since it is exponentially better in terms of query
-    utilization than SG.
+    utilization than SG. Two variants of RS search for the breakpoint of the
+    counterexample starting from its end: exponential search (ES), followed by
+    binary search, and linear search (LS) which tries the shortest suffixes
+    first. They need fewer queries when the breakpoint is close to the end of
+    the counterexample, as is common for long random counterexamples. The
+    number of queries spent on counterexamples is kept in ce_stats, so the
+    methods can be compared on a target.
     """
     def __init__(self, I, loglevel=logging.INFO, logfile='learn_mm.log',
-                 ce_processing=CE_RS):
+                 ce_processing=CE_RS, query_cache=None, executor=None,
+                 checkpoint_file=None, checkpoint_interval=0,
+                 shrink_counterexamples=False, replay_cache=True,
+                 replay_sample=None):
         """
         Args:
             I (list): The input alphabet for the machine. A list of integers.
             loglevel: See logging module documentation.
             logfile (str): File to save logs.
             ce_processing (int): Which counterexample method to use. Use
-            CE_RS for Rivest-Schapire and CE_SG for Shabaz-Groz.
+            CE_RS for Rivest-Schapire, CE_SG for Shabaz-Groz, CE_ES for
+            exponential search and CE_LS for linear search.
+            query_cache (QueryCache): Cache for the membership queries. By
+            default an unbounded cache is used.
+            executor: Executor used to answer the membership queries of every
+            learning step in parallel, such as a ThreadPoolExecutor. By
+            default the queries are answered one at a time.
+            checkpoint_file (str): File to periodically save the state of
+            the learner in, see the resume() method. By default no
+            checkpoints are saved.
+            checkpoint_interval (int): Minimum number of seconds between two
+            checkpoints.
+            shrink_counterexamples (bool): Shrink every counterexample
+            before processing it, see _shrink_counterexample().
+            replay_cache (bool): Before every equivalence query, run the
+            cached membership queries in the hypothesis and use any
+            disagreement as a counterexample.
+            replay_sample (int): Maximum number of cached queries to run. By
+            default all the cached queries are run.
         """
-        #Initialize the logging for the algorithm.
-        logging.basicConfig(filename=logfile,
-                            format='%(asctime)s:%(levelname)s: %(message)s',
-                            filemode='w', # Overwrite any old log files
-                            level=loglevel)
+        _ObservationTableLearner.__init__(
+            self, I, loglevel, logfile, query_cache=query_cache,
+            executor=executor, checkpoint_file=checkpoint_file,
+            checkpoint_interval=checkpoint_interval,
+            shrink_counterexamples=shrink_counterexamples,
+            replay_cache=replay_cache, replay_sample=replay_sample)
 
         if ce_processing == CE_SG:
             logging.info('Using Shabaz-Groz counterexample processing.')
@@ -134,113 +92,96 @@ class MealyMachineLearner(object):
         elif ce_processing == CE_RS:
             logging.info('Using Rivest-Schapire counterexample processing.')
             self.process_counterexample = self._process_ce_rs
+        elif ce_processing == CE_ES:
+            logging.info('Using exponential search counterexample processing.')
+            self.process_counterexample = self._process_ce_es
+        elif ce_processing == CE_LS:
+            logging.info('Using linear search counterexample processing.')
+            self.process_counterexample = self._process_ce_ls
         else:
             raise NotImplementedError('Unsupported counterexample processing')
 
         # Initialize the observation table with the input alphabet
-        self.I = list(I)
         self.ot = _ObservationTable(I)
-        self._hypothesis = None
-
-    def membership_query(self, inp):
-        """
-        Abstract method, it should implement the membership query. On input
-        a string s the method must return the output of the target Mealy
-        Machine on that string.
+        # Number of counterexamples processed, of breakpoints checked and of
+        # membership queries issued for processing them.
+        self.ce_processing = ce_processing
+        self.ce_stats = {'counterexamples': 0, 'probes': 0, 'queries': 0}
 
-        Args:
-            inp (list): Input for the target mealy machine.
-        Returns:
-            list: Output of the target machine on input inp.
-        """
-        raise NotImplementedError('Membership Query method is not implemented')
+    #########################################################################
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
-    def equivalence_query(self, hypothesis):
+    def _check_suffix(self, inp, access_string, index):
         """
-        Abstract method, it should implement equivalence query. In systems
-        where an equivalence query is unavailable a search strategy should
-        be implemented to search for counterexamples. In absence of a
-        counterexample one should assume that the machine is correct.
+        Check if the outputs of the target machine and the hypothesis agree on
+        the suffix inp[index:], when it is given after access_string.
 
         Args:
-            hypothesis(Transducer): The hypothesis to test for correctness.
+            inp(list): string to check
+            access_string(list): access_string for state to be tested.
+            index (int): breakpoint in string inp
 
         Returns:
-            tuple(bool, list): True, None if the hypothesis is found to be
-            correct, or False, ce where ce is an input where the hypothesis
-            and target machine disagree.
+            True if outputs disagree and False otherwise.
         """
-        raise NotImplementedError('Equivalence Query method is not implemented')
+        self.ce_stats['probes'] += 1
+        prefix_as, full_as = self.cached_membership_queries(
+            [access_string, access_string + inp[index:]])
+        as_suffix = full_as[_common_prefix_length(prefix_as, full_as):]
+        prefix_hyp = self._hypothesis.consume_input(access_string)
+        full_hyp = self._hypothesis.consume_input(access_string + inp[index:])
+        hyp_suffix = full_hyp[_common_prefix_length(prefix_hyp, full_hyp):]
+        return True if list(as_suffix) != list(hyp_suffix) else False
 
 
-    def _fill_ot_entry(self, row, col):
+    def _is_diff(self, ce, index):
         """
-        Fill an entry of the observation table.
-        Only save the part of the output generated by the col parameter.
+        Check if the target machine and the hypothesis disagree on the suffix
+        ce[index:] after the state reached by the hypothesis on ce[:index].
 
         Args:
-            row(tuple(int)): A tuple of integers specifiying the row to fill.
-            col(tuple(int)): A tuple of integers specifying the column to fill.
-        """
-        prefix = self.membership_query(row)
-        full_output = self.membership_query(row + col)
+            ce (list): counterexample input
+            index (int): breakpoint in the counterexample
 
-        common_prefix_len = len(commonprefix([prefix, full_output]))
-        self.ot[row, col] = full_output[common_prefix_len:]
+        Returns:
+            True if they disagree and False otherwise.
+        """
+        access_string = list(self._run_in_hypothesis(ce, index))
+        return self._check_suffix(ce, access_string, index)
 
-    #########################################################################
-    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
-    def _run_in_hypothesis(self, inp, index):
-        """""
-        Run the string in the hypothesis automaton for index steps and then
-        return the access string for the state reached.
+    def _binary_search(self, ce, diff, same):
+        """
+        Binary search for a breakpoint of the counterexample, an index such
+        that the suffix starting at it is a distinguishing string.
 
         Args:
-            inp(list): Input to run the machine on.
-            index(int): How many steps to execute.
+            ce (list): counterexample input
+            diff (int): An index where the target and hypothesis disagree.
+            same (int): A larger index where the target and hypothesis agree.
 
         Returns:
-            tuple (int): A tuple containing the access string for the state
-            reached by running the machine.
+            int: The breakpoint.
         """
-        state = self._hypothesis[0]
-        for i in range(index):
-            for arc in state.arcs:
-                if arc.ilabel == inp[i]:
-                    state = self._hypothesis[arc.nextstate]
-                    s_index = arc.nextstate
-
-        # The id of the state is its index inside the row list of the ot.
-        access_string = self.ot.access_strings[s_index]
-        logging.debug('Access string for index %d: %s - %d ',
-                      index, access_string, s_index)
-        return access_string
+        while same - diff > 1:
+            i = (same + diff) / 2
+            if self._is_diff(ce, i):
+                diff = i
+            else:
+                same = i
+        return same
 
 
-    def _check_suffix(self, inp, access_string, index):
+    def _add_experiment(self, exp):
         """
-        Check if the suffixes produced by running the target machine in
-        the strings access_string + inp[index:] and inp and check if the suffixes
-        agree.
+        Add a distinguishing string to the observation table.
 
         Args:
-            inp(list): string to check
-            access_string(list): access_string for state to be tested.
-            index (int): breakpoint in string inp
-
-        Returns:
-            True if strings disagree and False otherwise.
+            exp (tuple): The distinguishing string.
         """
-        prefix_as = self.membership_query(access_string)
-        full_as = self.membership_query(access_string + inp[index:])
-        prefix_inp = self.membership_query(inp[:index])
-        full_inp = self.membership_query(inp)
-        common_prefix_len = len(commonprefix([prefix_as, full_as]))
-        as_suffix = full_as[common_prefix_len:]
-        common_prefix_len = len(commonprefix([prefix_inp, full_inp]))
-        inp_suffix = full_inp[common_prefix_len:]
-        return True if as_suffix != inp_suffix else False
+        self.ot.dist_strings.append(exp)
+        self._fill_ot_entries([(row, exp) for row in
+                               self.ot.access_strings + self.ot.transitions])
 
 
     def _process_ce_rs(self, ce):
@@ -250,24 +191,46 @@ class MealyMachineLearner(object):
         Args:
             ce (list): counterexample input
         """
+        # The target and the hypothesis disagree on the whole counterexample
+        # and trivially agree on its empty suffix.
+        breakpoint = self._binary_search(ce, 0, len(ce))
+        self._add_experiment(tuple(ce[breakpoint:]))
 
-        diff = len(ce)
-        same = 0
-        while True:
-            i = (same + diff) / 2
-            access_string = list(self._run_in_hypothesis(ce, i))
-            is_diff = self._check_suffix(ce, access_string, i)
-            if is_diff:
+
+    def _process_ce_es(self, ce):
+        """
+        Counterexample processing using exponential search from the end of
+        the counterexample, followed by binary search.
+
+        Args:
+            ce (list): counterexample input
+        """
+        diff = 0
+        same = len(ce)
+        step = 1
+        while same - step > diff:
+            i = same - step
+            if self._is_diff(ce, i):
                 diff = i
-            else:
-                same = i
-            if diff-same == 1:
                 break
-        exp = tuple(ce[diff:])
+            same = i
+            step *= 2
+        breakpoint = self._binary_search(ce, diff, same)
+        self._add_experiment(tuple(ce[breakpoint:]))
 
-        self.ot.dist_strings.append(exp)
-        for row in self.ot.access_strings + self.ot.transitions:
-            self._fill_ot_entry(row, exp)
+
+    def _process_ce_ls(self, ce):
+        """
+        Counterexample processing using linear search from the end of the
+        counterexample, trying the shortest suffixes first.
+
+        Args:
+            ce (list): counterexample input
+        """
+        breakpoint = len(ce)
+        while breakpoint > 1 and not self._is_diff(ce, breakpoint - 1):
+            breakpoint -= 1
+        self._add_experiment(tuple(ce[breakpoint:]))
 
 
     #########################################################################
@@ -294,66 +257,22 @@ class MealyMachineLearner(object):
 
         # Add the all the suffixes as experiments in E_m
         suff = ()
+        entries = []
         for c in reversed(ce[maxlen:]):
             suff = (c,) + suff
             # Add the experiment if not already there
             if suff not in self.ot.dist_strings:
                 self.ot.dist_strings.append(suff)
 
-            # Fill the entries in the observation table
+            # Collect the entries in the observation table
             for row in self.ot.access_strings + self.ot.transitions:
-                self._fill_ot_entry(row, suff)
+                entries.append((row, suff))
+        self._fill_ot_entries(entries)
 
 
     #########################################################################
     # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
 
-    def _close_ot(self, escaping_str):
-        """
-        Given a transition escaping_str in transitions that is not equivalent with any
-        access_string this method will move that transition in access_strings
-        and create all corresponding transitions in the table.
-
-        Args:
-            escaping_str (tuple(int)): escaping transition
-        """
-        self.ot.access_strings.append(escaping_str)
-        for i in self.I:
-            self.ot.transitions.append(escaping_str + (i, ))
-            for dist in self.ot.dist_strings:
-                self._fill_ot_entry(escaping_str + (i, ), dist)
-
-    def _construct_hypothesis(self):
-        """
-        Utilize the observation table to construct a Mealy Machine.
-
-        Returns:
-            Transducer: A mealy machine build based on a closed and consistent
-            observation table.
-        """
-        mm = Transducer()
-        for access_string in self.ot.access_strings:
-            for i in self.I:
-                dst = self.ot.equiv_classes[access_string + (i,)]
-                # If dst == None then the table is not closed.
-                if dst is None:
-                    logging.debug('Conjecture attempt on non closed table.')
-                    return None
-                out = self.ot[access_string, (i, )]
-                src_id = self.ot.access_strings.index(access_string)
-                dst_id = self.ot.access_strings.index(dst)
-                if not self.ot[access_string, (i, )]:
-                    out = [EPSILON]
-                else:
-                    out = [int(x) for x in self.ot[access_string, (i, )]]
-                mm.add_arc(src_id, dst_id, [int(i)], out)
-
-        # This is for format compatibility with the DFA/SFAs.
-        for state in mm.states:
-            state.final = True
-        return mm
-
-
     def _init_ot(self):
         """
         Initialize the observation table.
@@ -361,10 +280,9 @@ class MealyMachineLearner(object):
         self.ot.access_strings.append(())
         self.ot.transitions = [(x, ) for x in list(self.I)]
         self.ot.dist_strings = [(x, ) for x in list(self.I)]
-        for i in self.ot.dist_strings:
-            self._fill_ot_entry((), i)
-        for trans, dist in product(self.ot.transitions, self.ot.dist_strings):
-            self._fill_ot_entry(trans, dist)
+        entries = [((), i) for i in self.ot.dist_strings]
+        entries.extend(product(self.ot.transitions, self.ot.dist_strings))
+        self._fill_ot_entries(entries)
 
 
     def learn_mealy_machine(self):
@@ -377,7 +295,18 @@ class MealyMachineLearner(object):
         """
         logging.info('Initializing learning procedure.')
         self._init_ot()
+        self._checkpoint()
+        return self._learning_loop()
+
 
+    def _learning_loop(self):
+        """
+        Implements the learning loop which follows the initialization of the
+        observation table.
+
+        Returns:
+            Transducer: A model for the target machine.
+        """
         logging.info('Generating a closed and consistent observation table.')
         while True:
 
@@ -393,15 +322,23 @@ class MealyMachineLearner(object):
                 else:
                     logging.debug('Table closed.')
 
+            # Save the closed table before the equivalence query
+            self._checkpoint()
+
             # Create conjecture
             self._hypothesis = self._construct_hypothesis()
 
             logging.info('Generated conjecture machine with %d states.',
                          len(self._hypothesis.states))
 
-            # Check correctness
-            logging.debug('Running equivalence query.')
-            found, ce = self.equivalence_query(self._hypothesis)
+            # Check correctness, first against the cached queries
+            ce = self._replay_cache() if self.replay_cache else None
+            if ce is not None:
+                logging.info('Found counterexample in the query cache.')
+                found = False
+            else:
+                logging.debug('Running equivalence query.')
+                found, ce = self.equivalence_query(self._hypothesis)
 
             # Are we done?
             if found:
@@ -410,8 +347,14 @@ class MealyMachineLearner(object):
 
             # Add the new experiments into the table to reiterate the
             # learning loop
+            misses = self.query_cache.misses
+            if self.shrink_counterexamples:
+                ce = self._shrink_counterexample(ce)
             logging.info('Processing counterexample %s with length %d.', ce, len(ce))
             self.process_counterexample(ce)
+            self.ce_stats['counterexamples'] += 1
+            self.ce_stats['queries'] += self.query_cache.misses - misses
+            self._checkpoint()
 
         logging.info('Learning complete.')
         return self._hypothesis
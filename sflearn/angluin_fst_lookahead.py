@@ -12,7 +12,8 @@ import logging
 from os.path import commonprefix
 from itertools import product
 
-from transducer import Transducer, EPSILON
+from observation_table import _common_prefix_length, _ObservationTable, \
+    _ObservationTableLearner
 
 def _remove_common_prefix(main, prefix):
     """
@@ -24,11 +25,10 @@ def _remove_common_prefix(main, prefix):
     Returns:
         list: suffix of main after removing common prefix with prefix list.
     """
-    common_part = commonprefix([main, prefix])
-    return main[len(common_part):]
+    return main[_common_prefix_length(main, prefix):]
 
 
-class _ObservationTable(object):
+class _LookaheadObservationTable(_ObservationTable):
     """
     This class implements the observation table data structure used by the
     inference algorithm. The table is similar in structure with the one used
@@ -40,13 +40,9 @@ class _ObservationTable(object):
         Args:
             I (list): input alphabet
         """
-        self.ot = {}
-        self.access_strings = []
-        self.transitions = []
-        self.dist_strings = I
+        _ObservationTable.__init__(self, I)
         self.I = I
         self.lookaheads = set([])
-        self.equiv_classes = {}
 
 
     def add_lookahead_transition(self, src, inp, out):
@@ -85,7 +81,7 @@ class _ObservationTable(object):
             found.
         """
         for col in self.dist_strings:
-            if self.ot[trans][col] != self.ot[acc_str][col]:
+            if self[trans, col] != self[acc_str, col]:
                 return col
         return None
 
@@ -98,60 +94,23 @@ class _ObservationTable(object):
             tuple(bool, str): True,None if table is closed, otherwise False,s
             is returned where s is an escaping string.
         """
+        self._update_signatures()
         for trans in self.transitions + \
                  [src+inp for (src, inp, _) in self.lookaheads]:
-            found = False
-            for acc_str in self.access_strings:
-                if self.ot[acc_str] == self.ot[trans]:
-                    self.equiv_classes[trans] = acc_str
-                    found = True
-                    break
-            if not found:
+            equiv = self._access_index.get(self._row_ids[trans])
+            if equiv is None:
                 logging.debug('Transition %s is escaping', trans)
                 for acc_str in self.access_strings:
                     col = self._get_difference(trans, acc_str)
                     logging.debug('%s with %s are different in %s : %s - %s',
-                                  trans, acc_str, col, self.ot[trans][col],
-                                  self.ot[acc_str][col])
+                                  trans, acc_str, col, self[trans, col],
+                                  self[acc_str, col])
                 return False, trans
+            self.equiv_classes[trans] = equiv
         return True, None
 
 
-    def __getitem__(self, key):
-        """
-        Return an entry from the observation table.
-
-        Args:
-            key (tuple(tuple(int),tuple(int))): A tuple containing the row
-            and column of the table respectively, where rows and columns are
-            also encoded as tuples of integers.
-
-        Returns:
-            list: The entry of the table at the requested position.
-        """
-        row, col = key
-        try:
-            return self.ot[row][col]
-        except KeyError:
-            return None
-
-    def __setitem__(self, key, value):
-        """
-        Sets the position of the table specified by key at value.
-
-        Args:
-            key (tuple(tuple(int),tuple(int))): A tuple containing the row
-            and column of the table respectively, where rows and columns are
-            also encoded as tuples of integers.
-            value (list): The value to set the table entry.
-        """
-        row, col = key
-        if row not in self.ot:
-            self.ot[row] = {}
-        self.ot[row][col] = value
-
-
-class TransducerLearner(object):
+class TransducerLearner(_ObservationTableLearner):
     """
     This class implements the learning algorithm for transducers with bounded
     lookahead. For more details on the algorith see the paper
@@ -169,72 +128,80 @@ class TransducerLearner(object):
 
 
     """
-    def __init__(self, I, loglevel=logging.DEBUG, logfile='learn_fst.log'):
+    def __init__(self, I, loglevel=logging.DEBUG, logfile='learn_fst.log',
+                 query_cache=None, executor=None,
+                 checkpoint_file=None, checkpoint_interval=0,
+                 shrink_counterexamples=False, replay_cache=True,
+                 replay_sample=None):
         """
         Args:
             I (list): The input alphabet for the machine. A list of integers.
             loglevel: See logging module documentation.
             logfile (str): File to save logs.
-        """
-        #Initialize the logging for the algorithm.
-        logging.basicConfig(filename=logfile,
-                            format='%(asctime)s:%(levelname)s: %(message)s',
-                            filemode='w', # Overwrite any old log files
-                            level=loglevel)
-
-        # Initialize the observation table with the inpur alphabet
-        self.I = I
-        self.ot = _ObservationTable(I)
-        self._hypothesis = None
-
-
-    def membership_query(self, inp):
-        """
-        Abstract method, it should implement the membership query. On input
-        a string s the method must return the output of the target Mealy
-        Machine on that string.
+            query_cache (QueryCache): Cache for the membership queries. By
+            default an unbounded cache is used.
+            executor: Executor used to answer the membership queries of every
+            learning step in parallel, such as a ThreadPoolExecutor. By
+            default the queries are answered one at a time.
+            checkpoint_file (str): File to periodically save the state of
+            the learner in, see the resume() method. By default no
+            checkpoints are saved.
+            checkpoint_interval (int): Minimum number of seconds between two
+            checkpoints.
+            shrink_counterexamples (bool): Shrink every counterexample
+            before processing it, see _shrink_counterexample().
+            replay_cache (bool): Before every equivalence query, run the
+            cached membership queries in the hypothesis and use any
+            disagreement as a counterexample.
+            replay_sample (int): Maximum number of cached queries to run. By
+            default all the cached queries are run.
+        """
+        _ObservationTableLearner.__init__(
+            self, I, loglevel, logfile, query_cache=query_cache,
+            executor=executor, checkpoint_file=checkpoint_file,
+            checkpoint_interval=checkpoint_interval,
+            shrink_counterexamples=shrink_counterexamples,
+            replay_cache=replay_cache, replay_sample=replay_sample)
+
+        # Initialize the observation table with the input alphabet
+        self.ot = _LookaheadObservationTable(I)
+
+
+    def trace_query(self, inp):
+        """
+        Answer the membership queries for all the non empty prefixes of an
+        input. Targets which can report their output after every input symbol
+        should override this method to answer them with a single run of the
+        target. By default every prefix is queried separately, through the
+        query cache and the membership_queries method.
 
         Args:
-            inp (list): Input for the target mealy machine.
+            inp (list): Input for the target machine.
         Returns:
-            list: Output of the target machine on input inp.
+            list: Outputs of the target machine on inp[:1], ..., inp[:n].
         """
-        raise NotImplementedError('Membership Query method is not implemented')
+        return self.cached_membership_queries([inp[:i]
+                                         for i in xrange(1, len(inp) + 1)])
 
 
-    def equivalence_query(self, hypothesis):
+    def _trace_query(self, inp):
         """
-        Abstract method, it should implement equivalence query. In systems
-        where an equivalence query is unavailable a search strategy should
-        be implemented to search for counterexamples. In absence of a
-        counterexample one should assume that the machine is correct.
+        Trace query through the query cache of the learner. The trace_query
+        method is only called if some prefix is missing from the cache, and
+        the outputs it returns are added to the cache.
 
         Args:
-            hypothesis(Transducer): The hypothesis to test for correctness.
-
+            inp (list): Input for the target machine.
         Returns:
-            tuple(bool, list): True, None if the hypothesis is found to be
-            correct, or False, ce where ce is an input where the hypothesis
-            and target machine disagree.
-        """
-        raise NotImplementedError('Equivalence Query method is not implemented')
-
-
-    def _fill_ot_entry(self, row, col):
-        """
-        Fill an entry of the observation table.
-        Only save the part of the output generated by the col parameter.
-
-        Args:
-            row(tuple(int)): A tuple of integers specifiying the row to fill.
-            col(tuple(int)): A tuple of integers specifying the column to fill.
+            list: Outputs of the target machine on inp[:1], ..., inp[:n].
         """
-
-        prefix = self.membership_query(row)
-        full_output = self.membership_query(row + col)
-
-        prefix_len = len(commonprefix([prefix, full_output]))
-        self.ot[row, col] = full_output[prefix_len:]
+        prefixes = [tuple(inp[:i]) for i in xrange(1, len(inp) + 1)]
+        if all(prefix in self.query_cache for prefix in prefixes):
+            return self.cached_membership_queries(prefixes)
+        outputs = self.trace_query(inp)
+        for prefix, out in zip(prefixes, outputs):
+            self.query_cache.put(prefix, out)
+        return outputs
 
 
     def _check_lookahead(self, inp):
@@ -247,13 +214,7 @@ class TransducerLearner(object):
             inp (list): Counterexample input.
         """
         # Make a prefix closed membership query and gather the result
-        prefix = []
-        prefix_set = [[]]
-        prefix_set_input = [[]]
-        for c in inp:
-            prefix.append(c)
-            prefix_set_input.append(prefix)
-            prefix_set.append(self.membership_query(prefix))
+        prefix_set = [[]] + list(self._trace_query(inp))
 
         for i in xrange(1, len(prefix_set)):
             if commonprefix([prefix_set[i], prefix_set[i-1]]) != prefix_set[i-1]:
@@ -269,8 +230,8 @@ class TransducerLearner(object):
 
                 la_out = _remove_common_prefix(prefix_set[i], prefix_set[j])
                 access_string = self._run_in_hypothesis(inp, j)
-                out_as = self.membership_query(access_string)
-                out_complete = self.membership_query(list(access_string)+la_inp)
+                out_as, out_complete = self.cached_membership_queries(
+                    [access_string, list(access_string) + la_inp])
 
                 # If The access string for the lookahead state is wrong, we will
                 # add the lookahead path once this is fixed in a next iteration.
@@ -282,46 +243,12 @@ class TransducerLearner(object):
                                                      tuple(la_inp),
                                                      tuple(la_out)):
                     # Fill all table entries for the lookahead transition
-                    for col in self.ot.dist_strings:
-                        self._fill_ot_entry(access_string + tuple(la_inp), col)
+                    self._fill_ot_entries([(access_string + tuple(la_inp), col)
+                                           for col in self.ot.dist_strings])
                     # New lookahead added, no need for further processing.
                     break
 
 
-    def _run_in_hypothesis(self, inp, index):
-        """""
-        Run the string in the hypothesis automaton for index steps and then
-        return the access string for the state reached.
-
-        Args:
-            inp(list): Input to run the machine on.
-            index(int): How many steps to execute.
-
-        Returns:
-            tuple (int): A tuple containing the access string for the state
-            reached by running the machine.
-        """
-        state = self._hypothesis[0]
-        s_index = 0
-        i = 0
-        while i != len(inp) and i < index:
-            found = False
-            for arc in sorted(state.arcs, key=lambda x: len(x.ilabel),
-                              reverse=True):
-                if inp[i:i+len(arc.ilabel)] == arc.ilabel:
-                    state = self._hypothesis.states[arc.nextstate]
-                    s_index = arc.nextstate
-                    found = True
-                    i += len(arc.ilabel)
-                    break
-            if not found:
-                raise Exception('Invalid Input: {}'.format(inp))
-
-        # The id of the state is its index inside the access_strings list
-        access_string = self.ot.access_strings[s_index]
-        return access_string
-
-
     def _process_counterexample(self, ce):
         """
         Counterexample processing method. The method is similar with the
@@ -347,73 +274,37 @@ class TransducerLearner(object):
 
         # Add the all the suffixes as experiments in distinguishing strings
         suff = ()
+        entries = []
         for c in reversed(ce[maxlen:]):
             suff = (c,) + suff
             # Add the experiment if not already there
             if suff not in self.ot.dist_strings:
                 self.ot.dist_strings.append(suff)
 
-            # Fill the entries in the observation table
+            # Collect the entries in the observation table
             for row in self.ot.access_strings + self.ot.transitions:
-                self._fill_ot_entry(row, suff)
+                entries.append((row, suff))
 
-            # Fill the lookahead transitions
+            # Collect the entries of the lookahead transitions
             for (src, inp, _) in self.ot.lookaheads:
-                self._fill_ot_entry(src+inp, suff)
+                entries.append((src+inp, suff))
+        self._fill_ot_entries(entries)
 
 
-    def _close_ot(self, escaping_str):
-        """
-        Given a transition escaping_str in transitions that is not equivalent with any
-        access_string this method will move that transition in access_strings
-        and create all corresponding transitions in the table.
-
-        Args:
-            escaping_str (tuple(int)): escaping transition
+    def _lookahead_arcs(self):
         """
-        self.ot.access_strings.append(escaping_str)
-        for i in self.I:
-            self.ot.transitions.append(escaping_str + (i,))
-            for dist in self.ot.dist_strings:
-                self._fill_ot_entry(escaping_str + (i,), dist)
-
-
-    def _construct_hypothesis(self):
-        """
-        Utilize the observation table to construct a Mealy Machine.
+        Return the lookahead transitions of the observation table.
 
         Returns:
-            Transducer: A mealy machine build based on a closed and consistent
-            observation table.
+            dict: Lists of (ilabel, dst, olabel) tuples indexed by the access
+            string of their source state.
         """
-        hypothesis = Transducer()
-        for acc_str in self.ot.access_strings:
-            for i in self.I:
-                dst = self.ot.equiv_classes[acc_str + (i,)]
-                # If dst == None then the table is not closed.
-                if dst is None:
-                    logging.debug('Conjecture attempt on non closed table.')
-                    return None
-                out = self.ot[acc_str, (i, )]
-                src_id = self.ot.access_strings.index(acc_str)
-                dst_id = self.ot.access_strings.index(dst)
-                if not self.ot[acc_str, (i, )]:
-                    out = [EPSILON]
-                else:
-                    out = [int(x) for x in self.ot[acc_str, (i, )]]
-                hypothesis.add_arc(src_id, dst_id, [int(i)], out)
-
-        # add the transitions from the lookahead list
+        lookaheads = {}
         for (src, inp, out) in self.ot.lookaheads:
             dst = self.ot.equiv_classes[src+inp]
-            src_id = self.ot.access_strings.index(src)
-            dst_id = self.ot.access_strings.index(dst)
-            hypothesis.add_arc(src_id, dst_id, list(inp), list(out))
-
-        # This is for format compatibility with the DFA/SFAs.
-        for state in hypothesis.states:
-            state.final = True
-        return hypothesis
+            lookaheads.setdefault(src, []).append(
+                (inp, self._state_ids[dst], out))
+        return lookaheads
 
 
     def _init_ot(self):
@@ -424,11 +315,9 @@ class TransducerLearner(object):
         self.ot.transitions = [(x,) for x in list(self.I)]
         self.ot.dist_strings = [(x,) for x in list(self.I)]
 
-        for dist in self.ot.dist_strings:
-            self._fill_ot_entry((), dist)
-
-        for trans, dist in product(self.ot.transitions, self.ot.dist_strings):
-            self._fill_ot_entry(trans, dist)
+        entries = [((), dist) for dist in self.ot.dist_strings]
+        entries.extend(product(self.ot.transitions, self.ot.dist_strings))
+        self._fill_ot_entries(entries)
 
 
     def learn_transducer(self):
@@ -441,7 +330,18 @@ class TransducerLearner(object):
         """
         logging.info('Initializing learning procedure.')
         self._init_ot()
+        self._checkpoint()
+        return self._learning_loop()
 
+
+    def _learning_loop(self):
+        """
+        Implements the learning loop which follows the initialization of the
+        observation table.
+
+        Returns:
+            Transducer: A model for the target machine.
+        """
         logging.info('Generating a closed and consistent observation table.')
         while True:
 
@@ -457,15 +357,23 @@ class TransducerLearner(object):
                 else:
                     logging.debug('Table closed.')
 
+            # Save the closed table before the equivalence query
+            self._checkpoint()
+
             # Create conjecture
             self._hypothesis = self._construct_hypothesis()
 
             logging.info('Generated conjecture machine with %d states.',
                          len(self._hypothesis.states))
 
-            # Check correctness
-            logging.debug('Running equivalence query.')
-            found, ce = self.equivalence_query(self._hypothesis)
+            # Check correctness, first against the cached queries
+            ce = self._replay_cache() if self.replay_cache else None
+            if ce is not None:
+                logging.info('Found counterexample in the query cache.')
+                found = False
+            else:
+                logging.debug('Running equivalence query.')
+                found, ce = self.equivalence_query(self._hypothesis)
 
             # Are we done?
             if found:
@@ -474,8 +382,11 @@ class TransducerLearner(object):
 
             # Add the new experiments into the table to reiterate the
             # learning loop
+            if self.shrink_counterexamples:
+                ce = self._shrink_counterexample(ce)
             logging.info('Processing counterexample %s with length %d.', ce, len(ce))
             self._process_counterexample(ce)
+            self._checkpoint()
 
         logging.info('Learning complete.')
         return self._hypothesis
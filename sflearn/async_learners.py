@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+This module contains the classes AsyncMealyMachineLearner and
+AsyncTransducerLearner, variants of the learning algorithms for targets which
+are accessed through asynchronous clients, such as HTTP or message queue
+clients running on an event loop.
+
+Instead of membership_query, these classes should implement the method
+membership_query_async(inp, callback) which starts the query and returns
+immediately. Once the output is available, the callback must be called with
+it, either from the event loop thread or from any other thread. All the
+independent queries of a learning step are started together and the number
+of queries in flight is bounded by the max_in_flight parameter.
+
+The learning algorithm itself is not asynchronous: every learning step blocks
+the calling thread until all its queries are answered. The learner must not
+run on the event loop thread, since the blocked loop could never deliver the
+callbacks. Run the event loop and the learner in separate threads, e.g. with
+an event loop offering call_soon_threadsafe:
+
+    class Learner(AsyncMealyMachineLearner):
+        def membership_query_async(self, inp, callback):
+            # Called on the learner thread, start the query on the loop.
+            loop.call_soon_threadsafe(client.query, inp, callback)
+
+    def learn():
+        try:
+            models.append(learner.learn_mealy_machine())
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+
+    models = []
+    learner = Learner(alphabet)
+    worker = threading.Thread(target=learn)
+    worker.start()
+    loop.run_forever()
+    worker.join()
+
+Clients returning futures can be adapted with a few lines, e.g. for a
+concurrent.futures style future:
+
+    def membership_query_async(self, inp, callback):
+        future = self.client.query(inp)
+        future.add_done_callback(
+            lambda f: callback(f.result()) if f.exception() is None
+            else callback(None, f.exception()))
+"""
+
+import sys
+import threading
+
+from angluin_fst import MealyMachineLearner
+from angluin_fst_lookahead import TransducerLearner
+
+
+class _AsyncQueries(object):
+
+    """
+    Implementation of the membership queries of the learners on top of the
+    membership_query_async method.
+    """
+
+    def membership_query_async(self, inp, callback):
+        """
+        Abstract method, it should start the membership query for input inp
+        and return immediately. Once the query is complete the method should
+        call callback(out), where out is the output of the target machine, or
+        callback(None, error) if the query failed with the exception error.
+        If the callback is called while handling error, the traceback of the
+        error is kept when it is raised by the learner.
+
+        Args:
+            inp (list): Input for the target machine.
+            callback (callable): Function to call with the output.
+        """
+        raise NotImplementedError('Membership Query method is not implemented')
+
+
+    def membership_query(self, inp):
+        """
+        Answer a single membership query through membership_query_async.
+
+        Args:
+            inp (list): Input for the target machine.
+        Returns:
+            list: Output of the target machine on input inp.
+        """
+        return self.membership_queries([inp])[0]
+
+
+    def membership_queries(self, inputs):
+        """
+        Start the membership queries for all the inputs, keeping at most
+        max_in_flight of them in flight, and wait until all of them are
+        complete. If a query fails, no more queries are started and the
+        error is raised once the running queries are complete. The calling
+        thread blocks while waiting, so it must not be the thread delivering
+        the callbacks.
+
+        Args:
+            inputs (list): List of inputs for the target machine.
+        Returns:
+            list: Outputs of the target machine, in the order of inputs.
+        """
+        slots = threading.Semaphore(self.max_in_flight)
+        done = threading.Condition()
+        results = [None] * len(inputs)
+        # Number of queries started and completed, and the exception info of
+        # the first error.
+        status = {'started': 0, 'completed': 0, 'error': None}
+
+        def make_callback(k):
+            def callback(out, error=None):
+                if error is not None:
+                    exc_info = sys.exc_info()
+                    if exc_info[1] is not error:
+                        exc_info = (type(error), error, None)
+                with done:
+                    results[k] = out
+                    if error is not None and status['error'] is None:
+                        status['error'] = exc_info
+                    status['completed'] += 1
+                    done.notify()
+                slots.release()
+            return callback
+
+        for k, inp in enumerate(inputs):
+            slots.acquire()
+            with done:
+                if status['error'] is not None:
+                    break
+                status['started'] += 1
+            try:
+                self.membership_query_async(inp, make_callback(k))
+            except Exception as error:
+                make_callback(k)(None, error)
+                break
+
+        with done:
+            while status['completed'] < status['started']:
+                done.wait()
+        if status['error'] is not None:
+            error_type, error, traceback = status['error']
+            raise error_type, error, traceback
+        return results
+
+
+class AsyncMealyMachineLearner(_AsyncQueries, MealyMachineLearner):
+    """
+    Variant of MealyMachineLearner for targets accessed asynchronously. In
+    order to use it, one should inherit the class and implement the
+    membership_query_async and equivalence_query methods.
+    """
+    def __init__(self, I, max_in_flight=64, **kwargs):
+        """
+        Args:
+            I (list): The input alphabet for the machine. A list of integers.
+            max_in_flight (int): Maximum number of membership queries in
+            flight at any time.
+            **kwargs: Arguments of the MealyMachineLearner class.
+        """
+        MealyMachineLearner.__init__(self, I, **kwargs)
+        self.max_in_flight = max_in_flight
+
+
+class AsyncTransducerLearner(_AsyncQueries, TransducerLearner):
+    """
+    Variant of TransducerLearner for targets accessed asynchronously. In
+    order to use it, one should inherit the class and implement the
+    membership_query_async and equivalence_query methods.
+    """
+    def __init__(self, I, max_in_flight=64, **kwargs):
+        """
+        Args:
+            I (list): The input alphabet for the machine. A list of integers.
+            max_in_flight (int): Maximum number of membership queries in
+            flight at any time.
+            **kwargs: Arguments of the TransducerLearner class.
+        """
+        TransducerLearner.__init__(self, I, **kwargs)
+        self.max_in_flight = max_in_flight
@@ -0,0 +1,477 @@
+#!/usr/bin/env python
+"""
+Implementation of a versioned binary file format for transducers. The file
+consists of a fixed size header followed by a state table, an arc table, a
+label table and a pool with the symbols of all labels. All values are little
+endian 32-bit integers, so a file can be opened through mmap and shared
+read-only by many processes without parsing it.
+
+Layout:
+    header: magic, version, flags, counts and offsets of the sections.
+    states: [first arc] [number of arcs] [flags] for every state.
+    arcs:   [src] [dest] [ilabel id] [olabel id] for every arc, grouped by
+            source state. If the _SORTED_ARCS header flag is set, the arcs of
+            every state are sorted by ilabel, keeping arcs with equal ilabels
+            in their original order.
+    labels: [offset] [length] in the symbol pool for every label.
+    symbols: the symbols of all the labels.
+"""
+
+import mmap
+import struct
+from sys import argv, byteorder
+from array import array
+
+from transducer import CompiledTransducer, _output_tuple, numpy
+from compact import CompactTransducer, LabelPool, _FINAL, _INITIAL
+
+MAGIC = 'SFLT'
+VERSION = 1
+
+# Header flags.
+_SORTED_ARCS = 1
+
+_HEADER = struct.Struct('<4sHHiiiiqqqq')
+_STATE = struct.Struct('<iii')
+_ARC = struct.Struct('<iiii')
+_LABEL = struct.Struct('<ii')
+_SYMBOL = struct.Struct('<i')
+
+
+def _align(offset):
+    """
+    Args:
+        offset (int): Offset in the file.
+    Returns:
+        int: The offset rounded up to a multiple of 8 bytes.
+    """
+    return (offset + 7) & ~7
+
+
+def _pack(values):
+    """
+    Args:
+        values (list): List of integers.
+    Returns:
+        str: The integers packed as little endian 32-bit values.
+    """
+    packed = array('i', values)
+    if byteorder == 'big':
+        packed.byteswap()
+    return packed.tostring()
+
+
+def save_binary(transducer, filename):
+    """
+    Save a transducer in the binary format.
+
+    Args:
+        transducer (Transducer): The machine to save.
+        filename (str): Filename to save the transducer in.
+    """
+    pool = LabelPool()
+    states = []
+    arcs = []
+    for state in transducer.states:
+        first = len(arcs) / 4
+        # The sort is stable, so the first of the arcs with equal ilabels,
+        # which is the one taken, stays first.
+        for arc in sorted(state.arcs, key=lambda arc: tuple(arc.ilabel)):
+            arcs.extend([state.stateid, arc.nextstate, pool.intern(arc.ilabel),
+                         pool.intern(arc.olabel)])
+        flags = (_FINAL if state.final else 0) | \
+                (_INITIAL if state.initial else 0)
+        states.extend([first, len(arcs) / 4 - first, flags])
+    labels = []
+    symbols = []
+    for label in pool.labels:
+        labels.extend([len(symbols), len(label)])
+        symbols.extend(label)
+
+    sections = [_pack(states), _pack(arcs), _pack(labels), _pack(symbols)]
+    offsets = []
+    offset = _HEADER.size
+    for section in sections:
+        offset = _align(offset)
+        offsets.append(offset)
+        offset += len(section)
+
+    with open(filename, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, _SORTED_ARCS, len(states) / 3,
+                             len(arcs) / 4, len(labels) / 2, len(symbols),
+                             *offsets))
+        for offset, section in zip(offsets, sections):
+            f.write('\0' * (offset - f.tell()))
+            f.write(section)
+
+
+class _MappedColumn(object):
+
+    """
+    Read-only sequence of one field of a table in a mapped file.
+    """
+
+    __slots__ = ('_buf', '_offset', '_count', '_row', '_field')
+
+    def __init__(self, buf, offset, count, row, field):
+        """
+        Args:
+            buf (mmap): The mapped file.
+            offset (int): Offset of the table in the file.
+            count (int): Number of rows in the table.
+            row (struct.Struct): Layout of a row of the table.
+            field (int): Index of the field in the row.
+        """
+        self._buf = buf
+        self._offset = offset
+        self._count = count
+        self._row = row
+        self._field = field
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._count:
+            raise IndexError('index out of range')
+        return self._row.unpack_from(self._buf,
+                                     self._offset + i * self._row.size)[self._field]
+
+
+class _MappedLabelPool(object):
+
+    """
+    Read-only label pool stored in a mapped file.
+    """
+
+    __slots__ = ('_buf', '_labels', '_count', '_symbols')
+
+    def __init__(self, buf, labels, count, symbols):
+        """
+        Args:
+            buf (mmap): The mapped file.
+            labels (int): Offset of the label table in the file.
+            count (int): Number of labels.
+            symbols (int): Offset of the symbol pool in the file.
+        """
+        self._buf = buf
+        self._labels = labels
+        self._count = count
+        self._symbols = symbols
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, label_id):
+        if not 0 <= label_id < self._count:
+            raise IndexError('label id out of range')
+        start, length = _LABEL.unpack_from(
+            self._buf, self._labels + label_id * _LABEL.size)
+        return struct.unpack_from('<{}i'.format(length), self._buf,
+                                  self._symbols + start * _SYMBOL.size)
+
+
+class _MappedCompiledTransducer(CompiledTransducer):
+
+    """
+    Runtime form of a mapped transducer whose arcs are sorted by ilabel. The
+    arcs are matched in place through binary search on the arc range of the
+    state, so nothing is decoded up front and the cost of every step is
+    logarithmic in the number of arcs of the state. The table and tries of
+    CompiledTransducer, needed by code generation and some of the learning
+    algorithms, are only built if they are accessed.
+    """
+
+    def __init__(self, fst):
+        """
+        Args:
+            fst (MappedTransducer): The transducer to run.
+        """
+        self._fst = fst
+        self._full = None
+        self._dense = None
+
+
+    def _decode(self):
+        """
+        Returns:
+            CompiledTransducer: The transducer compiled from all its arcs.
+        """
+        if self._full is None:
+            self._full = CompiledTransducer(self._fst)
+        return self._full
+
+
+    @property
+    def table(self):
+        return self._decode().table
+
+
+    @property
+    def tries(self):
+        return self._decode().tries
+
+
+    def _label_symbol(self, aid, depth):
+        """
+        Args:
+            aid (int): Index of the arc.
+            depth (int): Position in the ilabel of the arc.
+        Returns:
+            int: The symbol at position depth of the ilabel of the arc, or
+            None if the ilabel is shorter. None compares lower than all the
+            symbols, in the same way that a label is sorted before its
+            extensions.
+        """
+        fst = self._fst
+        buf = fst._mmap
+        lid = _ARC.unpack_from(buf, fst._off_arcs + aid * _ARC.size)[2]
+        start, length = _LABEL.unpack_from(
+            buf, fst._off_labels + lid * _LABEL.size)
+        if depth >= length:
+            return None
+        return _SYMBOL.unpack_from(
+            buf, fst._off_symbols + (start + depth) * _SYMBOL.size)[0]
+
+
+    def _search(self, state, inp, i):
+        """
+        Find the arc with the longest ilabel matching the input on position
+        i. The arcs sharing the first depth matched symbols form a range of
+        the sorted arcs of the state, which is narrowed by binary search on
+        every further symbol.
+
+        Args:
+            state (int): Index of the state.
+            inp (list): Input to the transducer.
+            i (int): Position of the input to start matching from.
+        Returns:
+            tuple, int, bool: The (nextstate, output) entry of the arc and the
+            length of its ilabel, or None, 0 if no arc matches, and whether a
+            longer arc may match if more input follows.
+        """
+        fst = self._fst
+        lo = fst._first[state]
+        hi = lo + fst._count[state]
+        entry = None
+        matched = 0
+        depth = 0
+        length = len(inp)
+        while i + depth != length and lo != hi:
+            c = inp[i + depth]
+            # The arcs with ilabels of exactly depth symbols are first.
+            start, end = lo, hi
+            while start < end:
+                mid = (start + end) // 2
+                if self._label_symbol(mid, depth) < c:
+                    start = mid + 1
+                else:
+                    end = mid
+            lo = start
+            end = hi
+            while start < end:
+                mid = (start + end) // 2
+                if self._label_symbol(mid, depth) <= c:
+                    start = mid + 1
+                else:
+                    end = mid
+            hi = start
+            if lo == hi:
+                break
+            depth += 1
+            if self._label_symbol(lo, depth) is None:
+                # The first of the arcs with an ilabel equal to the input.
+                olabel = fst.pool[fst._olabel[lo]]
+                entry = (fst._dst[lo], _output_tuple(olabel))
+                matched = depth
+                lo += 1
+        pending = i + depth == length and lo != hi
+        return entry, matched, pending
+
+
+    def match(self, state, inp, i):
+        entry, matched, _ = self._search(state, inp, i)
+        return entry, matched
+
+
+    def consume_input(self, inp):
+        inp = list(inp)
+        out = []
+        state = 0
+        i = 0
+        length = len(inp)
+        while i != length:
+            entry, matched, _ = self._search(state, inp, i)
+            if entry is None:
+                raise Exception('Invalid Input: {}'.format(inp))
+            state = entry[0]
+            out.extend(entry[1])
+            i += matched
+        return out
+
+
+    def advance(self, state, buf, out, final=False):
+        while buf:
+            entry, matched, pending = self._search(state, buf, 0)
+            # A longer arc may still match once more input arrives.
+            if pending and not final:
+                break
+            if entry is None:
+                raise Exception('Invalid Input: {}'.format(buf))
+            state = entry[0]
+            out.extend(entry[1])
+            del buf[:matched]
+        return state
+
+
+    def consume_many(self, inputs, batch_size=4096, max_cells=1 << 20):
+        """
+        Return the outputs of the machine for a list of inputs, in the form
+        of CompiledTransducer.consume_many(). The inputs are consumed one at
+        a time, as the dense matrices of the batched path need all the arcs
+        decoded.
+
+        Args:
+            inputs (list): List of inputs to the transducer.
+            batch_size (int): Unused.
+            max_cells (int): Unused.
+        Returns:
+            array, array: The concatenated outputs and their offsets.
+        """
+        if numpy is None:
+            return super(_MappedCompiledTransducer, self).consume_many(inputs)
+        return self._consume_scalar(list(inputs))
+
+
+class MappedTransducer(CompactTransducer):
+    """
+    Read-only transducer backed by a memory mapped file in the binary format.
+    Opening a file does not parse it, states and arcs are decoded on access
+    and the pages of the file are shared by all processes mapping it. Files
+    written by save_binary() are also run in place, see compile().
+    """
+    def __init__(self, filename):
+        """
+        Args:
+            filename (str): Filename of the transducer in binary format.
+        """
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = self._mmap
+        if len(buf) < _HEADER.size:
+            raise ValueError('Not a transducer file: {}'.format(filename))
+        (magic, version, flags, num_states, num_arcs, num_labels, _,
+         off_states, off_arcs, off_labels, off_symbols) = \
+                _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a transducer file: {}'.format(filename))
+        if version != VERSION:
+            raise ValueError('Unsupported transducer file version {}'.format(
+                version))
+
+        self.pool = _MappedLabelPool(buf, off_labels, num_labels, off_symbols)
+        self.I = set([])
+        self._compiled = None
+        self._sorted = bool(flags & _SORTED_ARCS)
+        self._off_arcs = off_arcs
+        self._off_labels = off_labels
+        self._off_symbols = off_symbols
+        self._first = _MappedColumn(buf, off_states, num_states, _STATE, 0)
+        self._count = _MappedColumn(buf, off_states, num_states, _STATE, 1)
+        self._flags = _MappedColumn(buf, off_states, num_states, _STATE, 2)
+        self._src = _MappedColumn(buf, off_arcs, num_arcs, _ARC, 0)
+        self._dst = _MappedColumn(buf, off_arcs, num_arcs, _ARC, 1)
+        self._ilabel = _MappedColumn(buf, off_arcs, num_arcs, _ARC, 2)
+        self._olabel = _MappedColumn(buf, off_arcs, num_arcs, _ARC, 3)
+
+
+    def _arc_ids(self, sid):
+        """
+        Args:
+            sid (int): index of the state.
+        Returns:
+            list: The indices of the arcs of the state.
+        """
+        first = self._first[sid]
+        return xrange(first, first + self._count[sid])
+
+
+    def compile(self):
+        """
+        Return the runtime form of the transducer. If the arcs in the file
+        are sorted by ilabel, they are matched in place and nothing is
+        decoded until a method needing the table of CompiledTransducer, such
+        as code generation, is called. Otherwise, all the arcs are decoded
+        into a CompiledTransducer, which takes time and memory proportional
+        to the size of the file.
+
+        Returns:
+            CompiledTransducer: The runtime form of the transducer.
+        """
+        if self._compiled is None:
+            if self._sorted:
+                self._compiled = _MappedCompiledTransducer(self)
+            else:
+                self._compiled = CompiledTransducer(self)
+        return self._compiled
+
+
+    def add_arc(self, src, dst, inp, out):
+        """
+        Mapped transducers are read-only.
+        """
+        raise TypeError('Mapped transducers are read-only')
+
+
+    def clear_arcs(self, src):
+        """
+        Mapped transducers are read-only.
+        """
+        raise TypeError('Mapped transducers are read-only')
+
+
+    def close(self):
+        """
+        Unmap the file of the transducer.
+        """
+        self._mmap.close()
+
+
+def load_binary(filename):
+    """
+    Open a transducer saved in the binary format.
+
+    Args:
+        filename (str): Filename to load the transducer from.
+    Returns:
+        MappedTransducer: The read-only mapped transducer.
+    """
+    return MappedTransducer(filename)
+
+
+def convert_text_to_binary(text_filename, binary_filename):
+    """
+    Convert a transducer saved in text format (see Transducer.save) into the
+    binary format.
+
+    Args:
+        text_filename (str): Filename of the transducer in text format.
+        binary_filename (str): Filename to save the binary transducer in.
+    """
+    trd = CompactTransducer()
+    trd.load(text_filename)
+    save_binary(trd, binary_filename)
+
+
+def main():
+    """
+    Simple interface to convert transducers from text to binary format.
+    """
+    if len(argv) != 3:
+        print 'Usage: {} transducer.txt transducer.bin'.format(argv[0])
+        return
+    convert_text_to_binary(argv[1], argv[2])
+
+
+if __name__ == '__main__':
+    main()
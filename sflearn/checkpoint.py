@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+This module implements the file format used by the learning algorithms to
+checkpoint their state. A checkpoint is a zlib compressed pickle which is
+written into a temporary file and then renamed over the previous checkpoint,
+so a crash while saving never leaves a corrupted checkpoint behind. The
+_Checkpointing mixin implements checkpointing and resuming for the learners.
+"""
+
+import cPickle
+import logging
+import os
+import time
+import zlib
+
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(state, filename):
+    """
+    Save the state of a learner into a checkpoint file.
+
+    Args:
+        state (dict): The state to save.
+        filename (str): Filename of the checkpoint.
+    """
+    data = zlib.compress(cPickle.dumps((CHECKPOINT_VERSION, state),
+                                       cPickle.HIGHEST_PROTOCOL))
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    # Renaming over an existing file is atomic on POSIX but fails on Windows.
+    if os.name == 'nt' and os.path.exists(filename):
+        os.remove(filename)
+    os.rename(tmp_filename, filename)
+
+
+def load_checkpoint(filename):
+    """
+    Load the state of a learner from a checkpoint file.
+
+    Args:
+        filename (str): Filename of the checkpoint.
+    Returns:
+        dict: The saved state.
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    try:
+        version, state = cPickle.loads(zlib.decompress(data))
+    except (zlib.error, cPickle.UnpicklingError, ValueError):
+        raise ValueError('Not a checkpoint file: {}'.format(filename))
+    if version != CHECKPOINT_VERSION:
+        raise ValueError('Unsupported checkpoint version {}'.format(version))
+    return state
+
+
+class _Checkpointing(object):
+
+    """
+    Implementation of the checkpoints of the observation table learners, on
+    top of their I, ot, query_cache and checkpoint attributes and their
+    _learning_loop method.
+    """
+
+    def _checkpoint(self):
+        """
+        Save the state of the learner in the checkpoint file, if one is set
+        and the checkpoint interval has passed since the last checkpoint.
+        """
+        if self.checkpoint_file is None:
+            return
+        now = time.time()
+        if self._last_checkpoint is not None and \
+                now - self._last_checkpoint < self.checkpoint_interval:
+            return
+        save_checkpoint({'I': self.I, 'ot': self.ot,
+                         'query_cache': self.query_cache},
+                        self.checkpoint_file)
+        self._last_checkpoint = now
+        logging.debug('Saved checkpoint in %s.', self.checkpoint_file)
+
+
+    def resume(self, filename):
+        """
+        Resume learning from a checkpoint saved by a previous run with the
+        same input alphabet. The observation table and the query cache are
+        restored, so no query answered before the checkpoint is issued again.
+        Attributes of subclasses are not part of the checkpoint. Unless the
+        learner was created with a different checkpoint file, new
+        checkpoints are saved in the same file.
+
+        Args:
+            filename (str): Filename of the checkpoint.
+        Returns:
+            Transducer: A model for the target machine.
+        """
+        state = load_checkpoint(filename)
+        if list(state['I']) != list(self.I):
+            raise ValueError('Checkpoint {} was saved for a different input '
+                             'alphabet'.format(filename))
+        self.ot = state['ot']
+        self.query_cache = state['query_cache']
+        # Drop the hypothesis built from any previous observation table.
+        self._hypothesis = None
+        self._state_ids = {}
+        self._state_arcs = []
+        self._trace = None
+        if self.checkpoint_file is None:
+            self.checkpoint_file = filename
+        self._last_checkpoint = time.time()
+        logging.info('Resuming learning procedure from %s.', filename)
+        return self._learning_loop()
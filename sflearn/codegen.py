@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+"""
+This module implements the PythonProgram class which is used to convert
+Transducer() objects into specialized Python functions.
+"""
+from sys import argv
+from transducer import Transducer
+
+_HEADER = '''#!/usr/bin/env python
+"""
+Sanitizer generated from a transducer with {states} states.
+"""
+
+# Every state is a dictionary indexed by input symbol. Simple arcs are stored
+# as (next state, output) tuples and lookahead paths as [children, arc] lists,
+# where arc is the transition taken if the path stops at that point.
+_S = [{{}} for _ in range({states})]
+'''
+
+_SIMPLE_BODY = '''
+
+def {name}(inp):
+    """
+    Return the output of the sanitizer for input inp.
+    """
+    out = []
+    extend = out.extend
+    state = _S[0]
+    try:
+        for c in inp:
+            state, o = state[c]
+            extend(o)
+    except KeyError:
+        raise Exception('Invalid Input: {{}}'.format(list(inp)))
+    return out
+'''
+
+_LOOKAHEAD_BODY = '''
+
+def {name}(inp):
+    """
+    Return the output of the sanitizer for input inp.
+    """
+    inp = list(inp)
+    out = []
+    extend = out.extend
+    state = _S[0]
+    i = 0
+    length = len(inp)
+    while i != length:
+        entry = state.get(inp[i])
+        i += 1
+        if entry.__class__ is list:
+            # Select the longest matching lookahead path
+            children, entry = entry
+            matched = i
+            while i != length and children:
+                node = children.get(inp[i])
+                if node is None:
+                    break
+                i += 1
+                if node.__class__ is list:
+                    children, arc = node
+                else:
+                    children, arc = None, node
+                if arc is not None:
+                    entry = arc
+                    matched = i
+            i = matched
+        if entry is None:
+            raise Exception('Invalid Input: {{}}'.format(inp))
+        state, o = entry
+        extend(o)
+    return out
+'''
+
+_FOOTER = '''
+
+if __name__ == '__main__':
+    import sys
+    print({name}([int(x) for x in sys.argv[1:]]))
+'''
+
+
+class PythonProgram(object):
+    """
+    Implements a compiler to transform Transducer objects into Python source
+    code. The generated code uses a dictionary for every state of the machine
+    with the outputs of the arcs inlined as tuple literals, and has no
+    dependency on this library so it can be saved as a standalone module.
+
+    The main public method is create_from_transducer() which will generate
+    the source code of the function, which can then be accessed in the
+    python_program public variable. The compile() method returns the function
+    itself.
+    """
+    def __init__(self, name='sanitizer'):
+        """
+        Args:
+            name (str): Name of the generated function.
+        """
+        self.program_name = name
+        self.transducer = None
+        self.python_program = None
+
+
+    @staticmethod
+    def _generate_arc_text(entry):
+        """
+        Args:
+            entry (tuple): (nextstate, output) entry of a compiled arc.
+        Returns:
+            str: Python literal for the arc.
+        """
+        nextstate, out = entry
+        if len(out) == 1:
+            out_text = '({},)'.format(out[0])
+        else:
+            out_text = '({})'.format(', '.join(str(c) for c in out))
+        return '(_S[{}], {})'.format(nextstate, out_text)
+
+
+    def _generate_trie_text(self, children):
+        """
+        Args:
+            children (dict): Children of a node of a compiled lookahead trie.
+        Returns:
+            str: Python literal for the dictionary of the children.
+        """
+        items = []
+        for c in sorted(children):
+            node_children, entry = children[c]
+            arc = self._generate_arc_text(entry) if entry else 'None'
+            if node_children:
+                arc = '[{}, {}]'.format(self._generate_trie_text(
+                    node_children), arc)
+            items.append('{}: {}'.format(c, arc))
+        return '{' + ', '.join(items) + '}'
+
+
+    def create_from_transducer(self, transducer):
+        """
+        Generate the Python source code of a function computing the output of
+        the input transducer.
+
+        Args:
+            transducer (Transducer): Transducer to compile into Python code.
+        Returns:
+            str: The generated Python source code.
+        """
+        self.transducer = transducer
+        compiled = transducer.compile()
+        states = len(compiled.table)
+        program = _HEADER.format(states=states)
+
+        for sid in xrange(states):
+            if compiled.tries[sid] is None:
+                items = ['{}: {}'.format(c, self._generate_arc_text(entry))
+                         for c, entry in sorted(compiled.table[sid].items())]
+                text = '{' + ', '.join(items) + '}'
+            else:
+                text = self._generate_trie_text(compiled.tries[sid])
+            program += '_S[{}].update({})\n'.format(sid, text)
+
+        if any(trie is not None for trie in compiled.tries):
+            program += _LOOKAHEAD_BODY.format(name=self.program_name)
+        else:
+            program += _SIMPLE_BODY.format(name=self.program_name)
+        program += _FOOTER.format(name=self.program_name)
+        self.python_program = program
+        return program
+
+
+    def compile(self):
+        """
+        Compile the generated source code and return the function. This
+        function requires the function create_from_transducer to be called
+        before it can be used.
+
+        Returns:
+            function: The function computing the output of the transducer.
+        """
+        namespace = {'__name__': 'sflearn_' + self.program_name}
+        code = compile(self.python_program, '<{}>'.format(self.program_name),
+                       'exec')
+        exec code in namespace
+        return namespace[self.program_name]
+
+
+    def save(self, filename='sanitizer.py'):
+        """
+        Saves the generated program into the file given as argument. This
+        function requires the function create_from_transducer to be called
+        before it can be used.
+
+        Args:
+            filename (str): Filename to save the Python module.
+        Returns:
+            bool: True if saving file is succesful, False otherwise.
+        """
+        if not self.python_program:
+            return False
+        with open(filename, 'w') as f:
+            f.write(self.python_program)
+        return True
+
+
+def main():
+    """
+    Simple interface to convert transducers from text format to Python code.
+    """
+    filename = 'transducer.txt'
+    if len(argv) > 1:
+        filename = argv[1]
+
+    trans = Transducer()
+    trans.load(filename)
+
+    program = PythonProgram()
+    program.create_from_transducer(trans)
+    print program.python_program
+
+
+if __name__ == '__main__':
+    main()
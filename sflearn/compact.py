@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+"""
+Implementation of a compact, array backed, Transducer class. Arcs are stored
+as a struct of arrays of integers while their labels are interned in a label
+pool which may be shared by many machines. The usual states, arcs and
+__getitem__ interface of the Transducer class is provided through lightweight
+views, so the compact machines can be used wherever a Transducer is expected.
+"""
+
+from sys import argv
+from array import array
+
+from transducer import Transducer
+
+# Flags kept for every state.
+_FINAL = 1
+_INITIAL = 2
+
+
+class LabelPool(object):
+
+    """
+    Pool of interned input and output labels. Every distinct label is stored
+    once and referenced through its integer id.
+    """
+
+    __slots__ = ('labels', '_ids')
+
+    def __init__(self):
+        self.labels = []
+        self._ids = {}
+
+
+    def intern(self, label):
+        """
+        Return the id of a label, adding it in the pool if necessary.
+
+        Args:
+            label (list): The label to intern.
+        Returns:
+            int: The id of the label in the pool.
+        """
+        label = tuple(label)
+        label_id = self._ids.get(label)
+        if label_id is None:
+            label_id = len(self.labels)
+            self._ids[label] = label_id
+            self.labels.append(label)
+        return label_id
+
+
+    def __getitem__(self, label_id):
+        """
+        Args:
+            label_id (int): id of the label.
+        Returns:
+            tuple: The label with the requested id.
+        """
+        return self.labels[label_id]
+
+
+    def __len__(self):
+        return len(self.labels)
+
+
+    def __getstate__(self):
+        """
+        The pool is pickled as its list of labels, which is needed by pickle
+        protocols below 2 for classes with __slots__.
+        """
+        return self.labels
+
+
+    def __setstate__(self, labels):
+        self.labels = labels
+        self._ids = dict((label, label_id)
+                         for label_id, label in enumerate(labels))
+
+
+class _ArcView(object):
+
+    """
+    View of an arc stored in a CompactTransducer, offering the same
+    attributes as FstArc.
+    """
+
+    __slots__ = ('_fst', '_aid')
+
+    def __init__(self, fst, aid):
+        """
+        Args:
+            fst (CompactTransducer): The machine holding the arc.
+            aid (int): Index of the arc in the arc arrays.
+        """
+        self._fst = fst
+        self._aid = aid
+
+    @property
+    def srcstate(self):
+        return self._fst._src[self._aid]
+
+    @property
+    def nextstate(self):
+        return self._fst._dst[self._aid]
+
+    @property
+    def ilabel(self):
+        return list(self._fst.pool[self._fst._ilabel[self._aid]])
+
+    @property
+    def olabel(self):
+        return list(self._fst.pool[self._fst._olabel[self._aid]])
+
+
+class _StateView(object):
+
+    """
+    View of a state stored in a CompactTransducer, offering the same
+    attributes as FstState. The arcs attribute is a read-only list, new arcs
+    must be added using the add_arc method of the machine.
+    """
+
+    __slots__ = ('_fst', 'stateid')
+
+    def __init__(self, fst, sid):
+        """
+        Args:
+            fst (CompactTransducer): The machine holding the state.
+            sid (int): Index of the state.
+        """
+        self._fst = fst
+        self.stateid = sid
+
+    def _get_flag(self, flag):
+        return bool(self._fst._flags[self.stateid] & flag)
+
+    def _set_flag(self, flag, value):
+        if value:
+            self._fst._flags[self.stateid] |= flag
+        else:
+            self._fst._flags[self.stateid] &= ~flag
+
+    initial = property(lambda self: self._get_flag(_INITIAL),
+                       lambda self, value: self._set_flag(_INITIAL, value))
+
+    final = property(lambda self: self._get_flag(_FINAL),
+                     lambda self, value: self._set_flag(_FINAL, value))
+
+    @property
+    def arcs(self):
+        fst = self._fst
+        return [_ArcView(fst, aid) for aid in fst._arc_ids(self.stateid)]
+
+
+class _StateList(object):
+
+    """
+    Read-only sequence of the states of a CompactTransducer.
+    """
+
+    __slots__ = ('_fst',)
+
+    def __init__(self, fst):
+        self._fst = fst
+
+    def __len__(self):
+        return len(self._fst._flags)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in xrange(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('state index out of range')
+        return _StateView(self._fst, i)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield _StateView(self._fst, i)
+
+
+class CompactTransducer(Transducer):
+    """
+    Transducer which keeps its arcs in arrays instead of objects. For every
+    arc the source, destination, ilabel id and olabel id are stored, while
+    the arcs of each state form a linked list through an array of next
+    indices. States and arcs are exposed through views, so all the methods of
+    the Transducer class work on the compact representation.
+    """
+    def __init__(self, pool=None):
+        """
+        Args:
+            pool (LabelPool): Label pool to intern labels into. Machines built
+            over a common alphabet may share a pool.
+        """
+        self.pool = pool if pool is not None else LabelPool()
+        self.I = set([])
+        self._compiled = None
+        self._src = array('i')
+        self._dst = array('i')
+        self._ilabel = array('i')
+        self._olabel = array('i')
+        self._next = array('i')
+        self._first = array('i', [-1])
+        self._last = array('i', [-1])
+        self._flags = bytearray([_INITIAL | _FINAL])
+
+
+    @classmethod
+    def from_transducer(cls, transducer, pool=None):
+        """
+        Create a compact copy of a transducer.
+
+        Args:
+            transducer (Transducer): The machine to copy.
+            pool (LabelPool): Label pool to intern labels into.
+        Returns:
+            CompactTransducer: The compact copy of the machine.
+        """
+        compact = cls(pool)
+        for state in transducer.states:
+            for arc in state.arcs:
+                compact.add_arc(arc.srcstate, arc.nextstate, arc.ilabel,
+                                arc.olabel)
+        for state in transducer.states:
+            compact[state.stateid].final = state.final
+            compact[state.stateid].initial = state.initial
+        compact.I = set(transducer.I)
+        return compact
+
+
+    @property
+    def states(self):
+        """
+        Read-only sequence with views of the states of the transducer.
+        """
+        return _StateList(self)
+
+
+    def __getitem__(self, i):
+        """
+        Return the i-th state of the transducer.
+        Args:
+            i (int) : index of state
+        """
+        return _StateList(self)[i]
+
+
+    def _arc_ids(self, sid):
+        """
+        Iterate over the indices of the arcs of a state.
+
+        Args:
+            sid (int): index of the state.
+        Yields:
+            int: index of each arc in the arc arrays.
+        """
+        aid = self._first[sid]
+        while aid != -1:
+            yield aid
+            aid = self._next[aid]
+
+
+    def add_arc(self, src, dst, inp, out):
+        """
+        Add a transition to the transducer.
+
+        Args:
+            src (int) : index of source state.
+            dst (int) : index of destination state.
+            inp (list): input consumed by the transition.
+            out (list): Output produced by the transition.
+        """
+        missing = max(src, dst) + 1 - len(self._flags)
+        if missing > 0:
+            self._first.extend([-1] * missing)
+            self._last.extend([-1] * missing)
+            self._flags.extend([_FINAL] * missing)
+
+        aid = len(self._src)
+        self._src.append(src)
+        self._dst.append(dst)
+        self._ilabel.append(self.pool.intern(inp))
+        self._olabel.append(self.pool.intern(out))
+        self._next.append(-1)
+        if self._last[src] == -1:
+            self._first[src] = aid
+        else:
+            self._next[self._last[src]] = aid
+        self._last[src] = aid
+        # Any compiled form of the machine is now stale.
+        self._compiled = None
+
+
+    def clear_arcs(self, src):
+        """
+        Remove all the transitions of a state. The arcs are unlinked from the
+        state, their entries in the arc arrays are not reclaimed.
+
+        Args:
+            src (int) : index of the state.
+        """
+        self._first[src] = -1
+        self._last[src] = -1
+        self._compiled = None
+
+
+def main():
+    """
+    Load a transducer in the compact representation and report its size.
+    """
+    trd = CompactTransducer()
+    trd.load(argv[1] if len(argv) > 1 else 'transducer.txt')
+    print 'States: {}\nArcs: {}\nLabels: {}'.format(len(trd.states),
+                                                    len(trd._src),
+                                                    len(trd.pool))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+"""
+This module contains the class DiscriminationTreeLearner which implements a
+Kearns-Vazirani style algorithm for inferring mealy machines with
+epsilon-transitions.
+
+Instead of an observation table, the states of the hypothesis are kept as the
+leaves of a discrimination tree. Every inner node of the tree is labeled with
+a distinguishing string and the children of the node are indexed by the
+output that the distinguishing string produces after the access string of a
+state. Each state is thus only queried with the distinguishing strings on its
+path from the root, instead of every distinguishing string of the table.
+"""
+
+import logging
+import random
+
+from transducer import EPSILON
+from query_cache import QueryCache, _CachedQueries
+from hypothesis import _IncrementalHypothesis
+
+
+def _suffix_output(prefix, full_output):
+    """
+    Return the part of full_output produced after the output prefix.
+
+    Args:
+        prefix (list): Output of the target on a prefix of the input.
+        full_output (list): Output of the target on the complete input.
+    Returns:
+        tuple: The suffix of full_output after its common prefix with prefix.
+    """
+    i = 0
+    length = min(len(prefix), len(full_output))
+    while i < length and prefix[i] == full_output[i]:
+        i += 1
+    return tuple(full_output[i:])
+
+
+class _Node(object):
+
+    """
+    Node of the discrimination tree. Inner nodes have a distinguishing string
+    and children indexed by output, while leaves hold the id of a state.
+    """
+
+    __slots__ = ('suffix', 'children', 'state')
+
+    def __init__(self, state):
+        """
+        Args:
+            state (int): Id of the state of the leaf.
+        """
+        self.suffix = None
+        self.children = None
+        self.state = state
+
+
+class DiscriminationTreeLearner(_CachedQueries, _IncrementalHypothesis):
+    """
+    Discrimination tree algorithm for inferring mealy machines with
+    epsilon-transitions.
+
+    This class is abstract. In order to use it, one should inherit the class
+    and implement the membership_query and equivalence_query methods, exactly
+    as for the MealyMachineLearner class, and then call the
+    learn_mealy_machine() method which will infer the mealy machine returning
+    an instance of the Transducer() class.
+
+    Counterexamples are processed with a Rivest-Schapire style binary search
+    which finds a single new state and the distinguishing string separating
+    it from an existing one, so only one leaf of the tree is split for every
+    counterexample.
+    """
+    def __init__(self, I, loglevel=logging.INFO, logfile='learn_dt.log',
+                 query_cache=None, executor=None, replay_cache=True,
+                 replay_sample=None):
+        """
+        Args:
+            I (list): The input alphabet for the machine. A list of integers.
+            loglevel: See logging module documentation.
+            logfile (str): File to save logs.
+            query_cache (QueryCache): Cache for the membership queries. By
+            default an unbounded cache is used.
+            executor: Executor used to answer the membership queries of every
+            learning step in parallel, such as a ThreadPoolExecutor. By
+            default the queries are answered one at a time.
+            replay_cache (bool): Before every equivalence query, run the
+            cached membership queries in the hypothesis and use any
+            disagreement as a counterexample.
+            replay_sample (int): Maximum number of cached queries to run. By
+            default all the cached queries are run.
+        """
+        #Initialize the logging for the algorithm.
+        logging.basicConfig(filename=logfile,
+                            format='%(asctime)s:%(levelname)s: %(message)s',
+                            filemode='w', # Overwrite any old log files
+                            level=loglevel)
+
+        self.I = list(I)
+        self.access_strings = []
+        self._root = None
+        # Leaf of every state, and the node reached by sifting every
+        # transition (state id, input symbol) into the tree.
+        self._leaves = []
+        self._transitions = {}
+        self._outputs = {}
+        self._hypothesis = None
+        # The transitions and arcs of every state in the current hypothesis.
+        self._state_arcs = []
+        self.query_cache = query_cache if query_cache is not None \
+                else QueryCache()
+        self.executor = executor
+        self.replay_cache = replay_cache
+        self.replay_sample = replay_sample
+        self._replay_random = random.Random(0)
+        # The last counterexample found by replaying the cache with the
+        # hypothesis it was found on, and the counterexamples which did not
+        # refine the hypothesis.
+        self._last_replay = None
+        self._replayed = set([])
+
+    def membership_query(self, inp):
+        """
+        Abstract method, it should implement the membership query. On input
+        a string s the method must return the output of the target Mealy
+        Machine on that string.
+
+        Args:
+            inp (list): Input for the target mealy machine.
+        Returns:
+            list: Output of the target machine on input inp.
+        """
+        raise NotImplementedError('Membership Query method is not implemented')
+
+    def equivalence_query(self, hypothesis):
+        """
+        Abstract method, it should implement equivalence query. In systems
+        where an equivalence query is unavailable a search strategy should
+        be implemented to search for counterexamples. In absence of a
+        counterexample one should assume that the machine is correct.
+
+        Args:
+            hypothesis(Transducer): The hypothesis to test for correctness.
+
+        Returns:
+            tuple(bool, list): True, None if the hypothesis is found to be
+            correct, or False, ce where ce is an input where the hypothesis
+            and target machine disagree.
+        """
+        raise NotImplementedError('Equivalence Query method is not implemented')
+
+
+    #########################################################################
+    # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+
+    def _add_state(self, access_string, leaf):
+        """
+        Add a new state to the hypothesis.
+
+        Args:
+            access_string (tuple(int)): Access string of the state.
+            leaf (_Node): Leaf of the state in the discrimination tree.
+        Returns:
+            list: The (transition, input, node) tuples to sift for the
+            transitions of the new state.
+        """
+        sid = len(self.access_strings)
+        logging.debug('Adding state %d with access string %s',
+                      sid, access_string)
+        leaf.state = sid
+        self.access_strings.append(access_string)
+        self._leaves.append(leaf)
+        return [((sid, i), access_string + (i,), self._root) for i in self.I]
+
+
+    def _sift(self, pending):
+        """
+        Sift transitions down the discrimination tree until they reach a
+        leaf. The queries for all the transitions at the same depth are
+        issued as a single batch. A transition reaching a missing child of
+        an inner node is a new state, whose transitions are sifted in turn.
+
+        Args:
+            pending (list): List of (transition, input, node) tuples, where
+            input is the access string of the transition and node the node of
+            the tree to start sifting from.
+        """
+        while pending:
+            queries = []
+            for _, inp, node in pending:
+                if node.state is None:
+                    queries.append(inp)
+                    queries.append(inp + node.suffix)
+            outputs = iter(self.cached_membership_queries(queries))
+            next_pending = []
+            for trans, inp, node in pending:
+                if node.state is not None:
+                    self._transitions[trans] = node
+                    continue
+                label = _suffix_output(next(outputs), next(outputs))
+                child = node.children.get(label)
+                if child is None:
+                    child = _Node(None)
+                    node.children[label] = child
+                    next_pending.extend(self._add_state(inp, child))
+                next_pending.append((trans, inp, child))
+            pending = next_pending
+
+
+    def _split(self, leaf, access_string, suffix):
+        """
+        Split the leaf of a state with a distinguishing string separating it
+        from a new state.
+
+        Args:
+            leaf (_Node): Leaf of the existing state.
+            access_string (tuple(int)): Access string of the new state.
+            suffix (tuple(int)): Distinguishing string for the two states.
+        """
+        old_access = self.access_strings[leaf.state]
+        old_prefix, old_full, new_prefix, new_full = self.cached_membership_queries(
+            [old_access, old_access + suffix, access_string,
+             access_string + suffix])
+        old_leaf = _Node(None)
+        new_leaf = _Node(None)
+        self._leaves[leaf.state] = old_leaf
+        old_leaf.state = leaf.state
+        leaf.state = None
+        leaf.suffix = suffix
+        leaf.children = {_suffix_output(old_prefix, old_full): old_leaf,
+                         _suffix_output(new_prefix, new_full): new_leaf}
+        logging.debug('Splitting state %s with distinguishing string %s',
+                      old_access, suffix)
+
+        # Transitions that led to the split leaf continue sifting from it.
+        pending = self._add_state(access_string, new_leaf)
+        for trans, node in self._transitions.iteritems():
+            if node is leaf:
+                sid, i = trans
+                pending.append((trans, self.access_strings[sid] + (i,), leaf))
+        self._sift(pending)
+
+
+    def _process_counterexample(self, ce):
+        """
+        Counterexample processing using the adapted Rivest-Schapire algorithm.
+        For every breakpoint i, the output of the hypothesis on the first i
+        symbols of ce is combined with the output produced by the remaining
+        symbols after the access string of the state reached. The two ends
+        differ, so a binary search finds a transition of the hypothesis
+        leading to a wrong state and the suffix proving it.
+
+        Args:
+            ce (list): counterexample input
+        Returns:
+            bool: True if the hypothesis was refined, False if ce is not a
+            counterexample for the hypothesis.
+        """
+        ce = tuple(ce)
+        table = self._hypothesis.compile().table
+        states = [0]
+        outputs = [()]
+        for c in ce:
+            nextstate, out = table[states[-1]][c]
+            states.append(nextstate)
+            outputs.append(outputs[-1] + out)
+
+        def breakpoint_output(i):
+            access_string = self.access_strings[states[i]]
+            prefix, full_output = self.cached_membership_queries(
+                [access_string, access_string + ce[i:]])
+            return outputs[i] + _suffix_output(prefix, full_output)
+
+        target = breakpoint_output(0)
+        if target == outputs[-1]:
+            logging.info('Input %s is not a counterexample.', list(ce))
+            return False
+        same = 0
+        diff = len(ce)
+        while diff - same > 1:
+            i = (same + diff) / 2
+            if breakpoint_output(i) == target:
+                same = i
+            else:
+                diff = i
+
+        access_string = self.access_strings[states[same]] + (ce[same],)
+        self._split(self._leaves[states[diff]], access_string, ce[diff:])
+        return True
+
+
+    def _construct_hypothesis(self):
+        """
+        Utilize the discrimination tree to construct a Mealy Machine. Only
+        the arcs of the states whose transitions changed since the previous
+        hypothesis are rebuilt.
+
+        Returns:
+            Transducer: A mealy machine build based on the discrimination
+            tree.
+        """
+        missing = [trans for trans in self._transitions
+                   if trans not in self._outputs]
+        queries = []
+        for sid, i in missing:
+            queries.append(self.access_strings[sid])
+            queries.append(self.access_strings[sid] + (i,))
+        outputs = self.cached_membership_queries(queries)
+        for k, trans in enumerate(missing):
+            self._outputs[trans] = _suffix_output(outputs[2 * k],
+                                                  outputs[2 * k + 1])
+
+        transitions = []
+        for src_id in xrange(len(self.access_strings)):
+            arcs = []
+            for i in self.I:
+                out = self._outputs[src_id, i]
+                arcs.append(((int(i),), self._transitions[src_id, i].state,
+                             tuple(int(x) for x in out) if out
+                             else (EPSILON,)))
+            transitions.append(arcs)
+        return self._build_hypothesis(transitions)
+
+
+    def _init_tree(self):
+        """
+        Initialize the discrimination tree with the initial state.
+        """
+        self._root = _Node(None)
+        self._sift(self._add_state((), self._root))
+
+
+    def learn_mealy_machine(self):
+        """
+        Implements the high level loop of the algorithm for learning a
+        Mealy machine.
+
+        Returns:
+            Transducer: A model for the target mealy machine.
+        """
+        logging.info('Initializing learning procedure.')
+        self._init_tree()
+
+        while True:
+            # Create conjecture
+            self._hypothesis = self._construct_hypothesis()
+
+            logging.info('Generated conjecture machine with %d states.',
+                         len(self._hypothesis.states))
+
+            # Check correctness, first against the cached queries
+            ce = self._replay_cache() if self.replay_cache else None
+            if ce is not None:
+                logging.info('Found counterexample in the query cache.')
+                found = False
+            else:
+                logging.debug('Running equivalence query.')
+                found, ce = self.equivalence_query(self._hypothesis)
+
+            # Are we done?
+            if found:
+                logging.info('No counterexample found. Hypothesis is correct!')
+                break
+
+            # A counterexample may reveal more than one state, so it is
+            # processed until the hypothesis agrees with the target on it.
+            logging.info('Processing counterexample %s with length %d.', ce, len(ce))
+            while self._process_counterexample(ce):
+                self._hypothesis = self._construct_hypothesis()
+
+        logging.info('Learning complete.')
+        return self._hypothesis
+
+
+if __name__ == '__main__':
+    print 'Discrimination tree algorithm for learning Mealy Machines ' + \
+            'abstract class implementation.'
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+This module contains executors used by the learning algorithms to answer the
+membership queries of a learning step in parallel. An executor is an object
+with a map(function, inputs) method returning the list of the results in the
+order of the inputs, so a model learned with an executor is identical to the
+one learned by answering the queries one at a time.
+
+Thread pools are the right choice when every query waits on an external
+process or a network service. Process pools should be used when answering a
+query is CPU bound in Python code.
+"""
+
+from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
+
+# Function answering the queries in the processes of a ProcessPoolExecutor.
+_worker_function = None
+
+
+def _init_worker(function):
+    """
+    Initializer of the processes of a ProcessPoolExecutor.
+
+    Args:
+        function (callable): Function answering the queries.
+    """
+    global _worker_function
+    _worker_function = function
+
+
+def _call_worker(inp):
+    """
+    Args:
+        inp (list): Input for the function of the worker.
+    Returns:
+        The result of the function of the worker on input inp.
+    """
+    return _worker_function(inp)
+
+
+class ThreadPoolExecutor(object):
+    """
+    Executor answering the queries on a pool of threads.
+    """
+    def __init__(self, workers=None):
+        """
+        Args:
+            workers (int): Number of threads. By default the number of
+            CPUs of the system is used.
+        """
+        self.workers = workers or cpu_count()
+        self._pool = None
+
+
+    def map(self, function, inputs):
+        """
+        Apply function on every input.
+
+        Args:
+            function (callable): Function to apply.
+            inputs (list): List of inputs.
+        Returns:
+            list: The results of the function, in the order of inputs.
+        """
+        if self._pool is None:
+            self._pool = ThreadPool(self.workers)
+        return self._pool.map(function, inputs)
+
+
+    def close(self):
+        """
+        Terminate the threads of the pool.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+class ProcessPoolExecutor(object):
+    """
+    Executor answering the queries on a pool of processes.
+
+    The function given to map() is passed to the processes when the pool is
+    forked, so it can be a bound method of the learner although such methods
+    cannot be pickled. The inputs and results are pickled. The processes work
+    on copies of the learner, so any state changed by the function, such as
+    query counters, is not visible in the parent process.
+    """
+    def __init__(self, workers=None):
+        """
+        Args:
+            workers (int): Number of processes. By default the number of
+            CPUs of the system is used.
+        """
+        self.workers = workers or cpu_count()
+        self._pool = None
+        self._function = None
+
+
+    def map(self, function, inputs):
+        """
+        Apply function on every input.
+
+        Args:
+            function (callable): Function to apply.
+            inputs (list): List of inputs.
+        Returns:
+            list: The results of the function, in the order of inputs.
+        """
+        if self._pool is None or self._function != function:
+            self.close()
+            self._pool = Pool(self.workers, _init_worker, (function,))
+            self._function = function
+        chunksize = max(1, len(inputs) / (4 * self.workers))
+        return self._pool.map(_call_worker, inputs, chunksize)
+
+
+    def close(self):
+        """
+        Terminate the processes of the pool.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._function = None
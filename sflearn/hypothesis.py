@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+This module contains the _IncrementalHypothesis mixin, which builds the
+hypotheses of the learners from the transitions of their states. The arcs of
+the states whose transitions did not change since the previous hypothesis are
+reused, while every hypothesis is a new Transducer, so the hypotheses handed
+to earlier equivalence queries are never modified.
+"""
+
+from transducer import Transducer, FstState, FstArc
+
+
+class _IncrementalHypothesis(object):
+
+    """
+    Implementation of the hypothesis construction of the learners, on top of
+    their _state_arcs attribute, a list which holds the transitions and the
+    arcs of every state of the previous hypothesis.
+    """
+
+    def _build_hypothesis(self, transitions):
+        """
+        Build a hypothesis from the transitions of its states. State 0 is the
+        initial state and every state is final, for format compatibility with
+        the DFA/SFAs.
+
+        Args:
+            transitions (list): The transitions of every state, as lists of
+            (ilabel, dst, olabel) tuples where the labels are tuples.
+        Returns:
+            Transducer: The hypothesis.
+        """
+        for src, trans in enumerate(transitions):
+            if src < len(self._state_arcs):
+                if self._state_arcs[src][0] == trans:
+                    continue
+            else:
+                self._state_arcs.append(None)
+            arcs = [FstArc(src, dst, list(ilabel), list(olabel))
+                    for ilabel, dst, olabel in trans]
+            self._state_arcs[src] = (trans, arcs)
+        del self._state_arcs[len(transitions):]
+
+        hypothesis = Transducer()
+        hypothesis.states = [FstState(src, initial=src == 0,
+                                      arcs=list(self._state_arcs[src][1]))
+                             for src in xrange(len(transitions))]
+        return hypothesis
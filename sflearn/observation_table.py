@@ -0,0 +1,365 @@
+#!/usr/bin/env python
+"""
+This module contains the observation table data structure and the parts of
+the L* style learners built on it which are common to the MealyMachineLearner
+and TransducerLearner classes: filling the table through the query cache,
+closing it and running counterexamples in the hypothesis.
+"""
+
+import logging
+import random
+
+from array import array
+from transducer import EPSILON
+from query_cache import QueryCache, _CachedQueries
+from checkpoint import _Checkpointing
+from hypothesis import _IncrementalHypothesis
+
+
+def _common_prefix_length(first, second):
+    """
+    Return the length of the common prefix of two sequences, without copying
+    them as os.path.commonprefix does.
+
+    Args:
+        first (list): First sequence.
+        second (list): Second sequence.
+    Returns:
+        int: The length of the common prefix.
+    """
+    length = min(len(first), len(second))
+    i = 0
+    while i < length and first[i] == second[i]:
+        i += 1
+    return i
+
+
+class _ObservationTable(object):
+
+    """
+    This class implements the observation table data structure used by the
+    L* algorithm.
+    """
+
+    def __init__(self, I):
+        """
+        Args:
+            I (list): input alphabet
+        """
+        self.ot = {}
+        self.access_strings = []
+        self.transitions = []
+        self.dist_strings = list(I)
+        self.equiv_classes = {}
+        # Outputs are interned and every row of ot is an array holding the
+        # output id of each column, in the order the columns were added.
+        self._column_ids = {}
+        self._output_ids = {(): 0}
+        self._outputs = [()]
+        # Every row is identified by the id of its signature, the contents of
+        # its array, so equal rows have equal ids.
+        self._signature_ids = {}
+        self._row_ids = {}
+        self._dirty = set([])
+        self._columns = 0
+        # Index from signature id to the first access string with that id.
+        self._access_index = {}
+        self._indexed = 0
+
+    def is_closed(self):
+        """
+        Check if the observation table is closed.
+
+        Returns:
+            tuple(bool, str): True,None if table is closed, otherwise False,s
+            is returned where s is an escaping string.
+        """
+        self._update_signatures()
+        for trans in self.transitions:
+            acc_str = self._access_index.get(self._row_ids[trans])
+            if acc_str is None:
+                logging.debug('Transition {} is escaping'.format(trans))
+                return False, trans
+            self.equiv_classes[trans] = acc_str
+        return True, None
+
+
+    def __getitem__(self, key):
+        """
+        Return the requested entry from the observation table.
+
+        Args:
+            key (tuple(tuple(int),tuple(int))): A tuple containing the row
+            and column of the table respectively, where rows and columns are
+            also encoded as tuples of integers.
+
+        Returns:
+            tuple: The entry of the table at the requested position.
+        """
+        row, col = key
+        try:
+            oid = self.ot[row][self._column_ids[col]]
+        except (KeyError, IndexError):
+            return None
+        return self._outputs[oid] if oid >= 0 else None
+
+    def __setitem__(self, key, value):
+        """
+        Sets the position of the table specified by key at value.
+
+        Args:
+            key (tuple(tuple(int),tuple(int))): A tuple containing the row
+            and column of the table respectively, where rows and columns are
+            also encoded as tuples of integers.
+            value (list): The value to set the table entry.
+        """
+        row, col = key
+        cid = self._column_ids.get(col)
+        if cid is None:
+            cid = self._column_ids[col] = len(self._column_ids)
+        value = tuple(value)
+        oid = self._output_ids.get(value)
+        if oid is None:
+            oid = self._output_ids[value] = len(self._outputs)
+            self._outputs.append(value)
+        entries = self.ot.get(row)
+        if entries is None:
+            entries = self.ot[row] = array('i')
+        if len(entries) <= cid:
+            entries.extend([-1] * (cid + 1 - len(entries)))
+        entries[cid] = oid
+        self._dirty.add(row)
+
+
+    def _update_signatures(self):
+        """
+        Recompute the signatures of the rows changed since the last call and
+        update the index of the access strings.
+        """
+        if self._columns != len(self._column_ids):
+            # Adding a column changes the signature of every row.
+            self._columns = len(self._column_ids)
+            self._signature_ids = {}
+            self._dirty.update(self.ot)
+        if self._dirty:
+            for row in self._dirty:
+                entries = self.ot[row]
+                if len(entries) < self._columns:
+                    entries.extend([-1] * (self._columns - len(entries)))
+                signature = entries.tostring()
+                self._row_ids[row] = self._signature_ids.setdefault(
+                    signature, len(self._signature_ids))
+            self._dirty.clear()
+            self._access_index = {}
+            self._indexed = 0
+        for acc_str in self.access_strings[self._indexed:]:
+            self._access_index.setdefault(self._row_ids[acc_str], acc_str)
+        self._indexed = len(self.access_strings)
+
+
+class _ObservationTableLearner(_CachedQueries, _Checkpointing,
+                               _IncrementalHypothesis):
+
+    """
+    Common part of the learners keeping their states in an observation table.
+    Subclasses create the table as the ot attribute and implement the
+    learning loop.
+    """
+
+    def __init__(self, I, loglevel, logfile, query_cache=None, executor=None,
+                 checkpoint_file=None, checkpoint_interval=0,
+                 shrink_counterexamples=False, replay_cache=True,
+                 replay_sample=None):
+        """
+        Args:
+            I (list): The input alphabet for the machine. A list of integers.
+            loglevel: See logging module documentation.
+            logfile (str): File to save logs.
+            query_cache (QueryCache): Cache for the membership queries.
+            executor: Executor used to answer the membership queries.
+            checkpoint_file (str): File to periodically save the state of
+            the learner in.
+            checkpoint_interval (int): Minimum number of seconds between two
+            checkpoints.
+            shrink_counterexamples (bool): Shrink every counterexample
+            before processing it.
+            replay_cache (bool): Replay the cached membership queries before
+            every equivalence query.
+            replay_sample (int): Maximum number of cached queries to replay.
+        """
+        #Initialize the logging for the algorithm.
+        logging.basicConfig(filename=logfile,
+                            format='%(asctime)s:%(levelname)s: %(message)s',
+                            filemode='w', # Overwrite any old log files
+                            level=loglevel)
+
+        self.I = list(I)
+        self._hypothesis = None
+        # Map from access strings to state ids and the transitions and arcs
+        # of every state in the current hypothesis.
+        self._state_ids = {}
+        self._state_arcs = []
+        # The hypothesis, input and states of the last run, see
+        # _run_in_hypothesis().
+        self._trace = None
+        self.query_cache = query_cache if query_cache is not None \
+                else QueryCache()
+        self.executor = executor
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_interval = checkpoint_interval
+        self._last_checkpoint = None
+        self.shrink_counterexamples = shrink_counterexamples
+        self.replay_cache = replay_cache
+        self.replay_sample = replay_sample
+        self._replay_random = random.Random(0)
+        # The last counterexample found by replaying the cache with the
+        # hypothesis it was found on, and the counterexamples which did not
+        # refine the hypothesis.
+        self._last_replay = None
+        self._replayed = set([])
+
+
+    def membership_query(self, inp):
+        """
+        Abstract method, it should implement the membership query. On input
+        a string s the method must return the output of the target Mealy
+        Machine on that string.
+
+        Args:
+            inp (list): Input for the target mealy machine.
+        Returns:
+            list: Output of the target machine on input inp.
+        """
+        raise NotImplementedError('Membership Query method is not implemented')
+
+
+    def equivalence_query(self, hypothesis):
+        """
+        Abstract method, it should implement equivalence query. In systems
+        where an equivalence query is unavailable a search strategy should
+        be implemented to search for counterexamples. In absence of a
+        counterexample one should assume that the machine is correct.
+
+        Args:
+            hypothesis(Transducer): The hypothesis to test for correctness.
+
+        Returns:
+            tuple(bool, list): True, None if the hypothesis is found to be
+            correct, or False, ce where ce is an input where the hypothesis
+            and target machine disagree.
+        """
+        raise NotImplementedError('Equivalence Query method is not implemented')
+
+
+    def _fill_ot_entries(self, entries):
+        """
+        Fill a list of entries of the observation table, issuing all the
+        needed membership queries in a single batch.
+
+        Args:
+            entries (list): List of (row, col) tuples of the entries to fill.
+        """
+        queries = []
+        for row, col in entries:
+            queries.append(row)
+            queries.append(row + col)
+        outputs = self.cached_membership_queries(queries)
+        for k, (row, col) in enumerate(entries):
+            prefix = outputs[2 * k]
+            full_output = outputs[2 * k + 1]
+            common_prefix_len = _common_prefix_length(prefix, full_output)
+            self.ot[row, col] = full_output[common_prefix_len:]
+
+
+    def _run_in_hypothesis(self, inp, index):
+        """""
+        Run the string in the hypothesis automaton for index steps and then
+        return the access string for the state reached. The states reached on
+        every prefix of the string are computed once and reused while the
+        same string is run in the same hypothesis.
+
+        Args:
+            inp(list): Input to run the machine on.
+            index(int): How many steps to execute.
+
+        Returns:
+            tuple (int): A tuple containing the access string for the state
+            reached by running the machine.
+        """
+        compiled = self._hypothesis.compile()
+        if self._trace is None or self._trace[0] is not compiled or \
+                self._trace[1] is not inp:
+            self._trace = (compiled, inp, compiled.trace(inp))
+        s_index = self._trace[2][index]
+
+        # The id of the state is its index inside the row list of the ot.
+        access_string = self.ot.access_strings[s_index]
+        logging.debug('Access string for index %d: %s - %d ',
+                      index, access_string, s_index)
+        return access_string
+
+
+    def _close_ot(self, escaping_str):
+        """
+        Given a transition escaping_str in transitions that is not equivalent with any
+        access_string this method will move that transition in access_strings
+        and create all corresponding transitions in the table.
+
+        Args:
+            escaping_str (tuple(int)): escaping transition
+        """
+        self.ot.access_strings.append(escaping_str)
+        entries = []
+        for i in self.I:
+            self.ot.transitions.append(escaping_str + (i, ))
+            for dist in self.ot.dist_strings:
+                entries.append((escaping_str + (i, ), dist))
+        self._fill_ot_entries(entries)
+
+
+    def _lookahead_arcs(self):
+        """
+        Return the transitions of the hypothesis with lookahead, which the
+        observation table does not hold. Learners with lookahead transitions
+        override this method.
+
+        Returns:
+            dict: Lists of (ilabel, dst, olabel) tuples indexed by the access
+            string of their source state.
+        """
+        return {}
+
+
+    def _construct_hypothesis(self):
+        """
+        Utilize the observation table to construct a Mealy Machine. Only the
+        arcs of the states whose transitions changed since the previous
+        hypothesis are rebuilt.
+
+        Returns:
+            Transducer: A mealy machine build based on a closed and consistent
+            observation table.
+        """
+        # The id of a state is the index of its access string, and access
+        # strings are only appended so ids never change.
+        for access_string in self.ot.access_strings[len(self._state_ids):]:
+            self._state_ids[access_string] = len(self._state_ids)
+
+        lookaheads = self._lookahead_arcs()
+        transitions = []
+        for access_string in self.ot.access_strings:
+            arcs = []
+            for i in self.I:
+                dst = self.ot.equiv_classes[access_string + (i,)]
+                # If dst == None then the table is not closed.
+                if dst is None:
+                    logging.debug('Conjecture attempt on non closed table.')
+                    return None
+                if not self.ot[access_string, (i, )]:
+                    out = (EPSILON,)
+                else:
+                    out = tuple(int(x) for x in self.ot[access_string, (i, )])
+                arcs.append(((int(i),), self._state_ids[dst], out))
+            arcs.extend(lookaheads.get(access_string, []))
+            transitions.append(arcs)
+        return self._build_hypothesis(transitions)
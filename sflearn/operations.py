@@ -0,0 +1,540 @@
+#!/usr/bin/env python
+"""
+This module contains algorithms operating on Transducer objects, such as
+minimization, equivalence checking and composition. All algorithms respect
+the semantics of the consume_input() method, i.e. lookahead arcs always take
+precedence over shorter arcs and outputs equal to [EPSILON] are considered
+empty.
+"""
+
+from collections import defaultdict, deque
+
+from transducer import Transducer, EPSILON, _output_tuple
+
+
+def _effective_arcs(state):
+    """
+    Return the arcs of a state which may ever be taken. Among arcs with the
+    same ilabel only the first one is used by consume_input().
+
+    Args:
+        state (FstState): The state to get the arcs from.
+    Returns:
+        list: The effective arcs of the state, in their original order.
+    """
+    seen = set([])
+    arcs = []
+    for arc in state.arcs:
+        ilabel = tuple(arc.ilabel)
+        if ilabel not in seen:
+            seen.add(ilabel)
+            arcs.append(arc)
+    return arcs
+
+
+def minimize(transducer):
+    """
+    Return the minimal transducer equivalent to the input one. States which
+    are not reachable from the initial state are removed and the rest are
+    merged using Hopcroft's partition refinement algorithm. Every arc is
+    treated as a letter made of its ilabel and its output, so two states are
+    merged only if they have arcs with the same ilabels, producing the same
+    outputs, towards equivalent states.
+
+    Args:
+        transducer (Transducer): The machine to minimize.
+    Returns:
+        Transducer: The minimized machine. State 0 is the initial state.
+    """
+    # Collect the reachable states and their arcs
+    arcs = {}
+    labels = {}
+    order = [0]
+    queue = deque([0])
+    while queue:
+        sid = queue.popleft()
+        arcs[sid] = _effective_arcs(transducer[sid])
+        labels[sid] = [(tuple(arc.ilabel), _output_tuple(arc.olabel))
+                       for arc in arcs[sid]]
+        for arc in arcs[sid]:
+            if arc.nextstate not in arcs:
+                arcs[arc.nextstate] = None
+                order.append(arc.nextstate)
+                queue.append(arc.nextstate)
+
+    # The inverse transition function for every arc label
+    inverse = defaultdict(lambda: defaultdict(list))
+    for sid in order:
+        for label, arc in zip(labels[sid], arcs[sid]):
+            inverse[label][arc.nextstate].append(sid)
+
+    # Initial partition: states with the same arc labels and finality
+    blocks = []
+    block_of = {}
+    initial = {}
+    for sid in order:
+        key = (transducer[sid].final, frozenset(labels[sid]))
+        if key not in initial:
+            initial[key] = len(blocks)
+            blocks.append(set([]))
+        blocks[initial[key]].add(sid)
+        block_of[sid] = initial[key]
+
+    # A block splits its predecessors on the labels of the arcs entering it,
+    # so every block is a splitter with every label.
+    all_labels = list(inverse)
+    pending = set([])
+    splitters = deque()
+    for bid in xrange(len(blocks)):
+        for label in all_labels:
+            pending.add((bid, label))
+            splitters.append((bid, label))
+
+    while splitters:
+        splitter = splitters.popleft()
+        pending.discard(splitter)
+        bid, label = splitter
+        # Find the states which move into the splitter block with this label
+        touched = defaultdict(set)
+        for dst in blocks[bid]:
+            for src in inverse[label].get(dst, ()):
+                touched[block_of[src]].add(src)
+
+        for split, sources in touched.iteritems():
+            if len(sources) == len(blocks[split]):
+                continue
+            # Keep the larger half in place and move the smaller one
+            if 2 * len(sources) > len(blocks[split]):
+                sources = blocks[split] - sources
+            new_bid = len(blocks)
+            blocks[split] -= sources
+            blocks.append(sources)
+            for sid in sources:
+                block_of[sid] = new_bid
+            for new_label in all_labels:
+                pending.add((new_bid, new_label))
+                splitters.append((new_bid, new_label))
+
+    # Build the minimal machine numbering the blocks in BFS order
+    minimal = Transducer()
+    new_id = {block_of[0]: 0}
+    queue = deque([0])
+    while queue:
+        rep = queue.popleft()
+        src = new_id[block_of[rep]]
+        minimal[src].final = transducer[rep].final
+        for arc in arcs[rep]:
+            dst_block = block_of[arc.nextstate]
+            if dst_block not in new_id:
+                new_id[dst_block] = len(new_id)
+                queue.append(arc.nextstate)
+            minimal.add_arc(src, new_id[dst_block], list(arc.ilabel),
+                            list(arc.olabel))
+    return minimal
+
+
+class _Runner(object):
+
+    """
+    Runs a transducer one input symbol at a time. A configuration of the
+    machine is the current state together with the input symbols buffered
+    while a lookahead arc may still match, or None if the input was rejected.
+    """
+
+    def __init__(self, transducer):
+        """
+        Args:
+            transducer (Transducer): The machine to run.
+        """
+        self.compiled = transducer.compile()
+        self._steps = {}
+        self._flushes = {}
+        self.initial = (0, ())
+
+
+    def step(self, config, symbol):
+        """
+        Args:
+            config (tuple): Configuration of the machine.
+            symbol (int): Next input symbol.
+        Returns:
+            tuple, tuple: The next configuration and the output produced.
+        """
+        if config is None:
+            return None, ()
+        key = (config, symbol)
+        if key not in self._steps:
+            buf = list(config[1])
+            buf.append(symbol)
+            out = []
+            try:
+                state = self.compiled.advance(config[0], buf, out)
+                self._steps[key] = ((state, tuple(buf)), tuple(out))
+            except Exception:
+                self._steps[key] = (None, ())
+        return self._steps[key]
+
+
+    def finish(self, config):
+        """
+        Args:
+            config (tuple): Configuration of the machine.
+        Returns:
+            tuple, tuple: The configuration reached and the output produced
+            if the input ends at this configuration, or None, None if the
+            input is rejected.
+        """
+        if config is None:
+            return None, None
+        if config not in self._flushes:
+            out = []
+            try:
+                state = self.compiled.advance(config[0], list(config[1]), out,
+                                              True)
+                self._flushes[config] = ((state, ()), tuple(out))
+            except Exception:
+                self._flushes[config] = (None, None)
+        return self._flushes[config]
+
+
+    def flush(self, config):
+        """
+        Args:
+            config (tuple): Configuration of the machine.
+        Returns:
+            tuple: The output produced if the input ends at this configuration
+            or None if the input is rejected.
+        """
+        return self.finish(config)[1]
+
+
+    def output(self, inp):
+        """
+        Args:
+            inp (list): Input to the machine.
+        Returns:
+            list: The output of the machine or None if the input is rejected.
+        """
+        try:
+            return self.compiled.consume_input(inp)
+        except Exception:
+            return None
+
+
+# Delay of two runs whose outputs can never agree again.
+_DIVERGED = 'diverged'
+
+
+def _combine_delay(delay, out1, out2):
+    """
+    Update the delay between the outputs of two machines. A delay (0, d)
+    means that the first machine has emitted d more than the second one and
+    (1, d) the opposite.
+
+    Args:
+        delay (tuple): The current delay.
+        out1 (tuple): New output of the first machine.
+        out2 (tuple): New output of the second machine.
+    Returns:
+        tuple: The new delay or _DIVERGED if the outputs disagree.
+    """
+    if delay == _DIVERGED:
+        return _DIVERGED
+    side, pending = delay
+    left = pending + out1 if side == 0 else out1
+    right = pending + out2 if side == 1 else out2
+    common = min(len(left), len(right))
+    if left[:common] != right[:common]:
+        return _DIVERGED
+    if len(left) >= len(right):
+        return (0, left[common:])
+    return (1, right[common:])
+
+
+def _ends_differently(run1, run2, node, delay):
+    """
+    Args:
+        run1 (_Runner): Runner of the first machine.
+        run2 (_Runner): Runner of the second machine.
+        node (tuple): Pair of configurations of the machines.
+        delay (tuple): Delay between the outputs of the machines.
+    Returns:
+        bool: True if the machines disagree when the input ends at node.
+    """
+    out1 = run1.flush(node[0])
+    out2 = run2.flush(node[1])
+    if out1 is None or out2 is None:
+        return (out1 is None) != (out2 is None)
+    return _combine_delay(delay, out1, out2) not in [(0, ()), (1, ())]
+
+
+def equivalent(transducer1, transducer2):
+    """
+    Decide whether two deterministic transducers produce the same output for
+    every input, including the inputs rejected by both machines.
+
+    The algorithm performs a breadth first search in the product of the two
+    machines, where every product state also records the delay between the
+    outputs of the machines. If the machines are equivalent every product
+    state is reached with a single delay, thus the search visits each product
+    state once. If the machines differ, a distinguishing input of minimal
+    length is returned.
+
+    Args:
+        transducer1 (Transducer): The first machine.
+        transducer2 (Transducer): The second machine.
+    Returns:
+        tuple(bool, list): True, None if the machines are equivalent, or
+        False, w where w is an input on which the machines disagree.
+    """
+    run1 = _Runner(transducer1)
+    run2 = _Runner(transducer2)
+    alphabet = sorted(set(c for trd in [transducer1, transducer2]
+                          for state in trd.states
+                          for arc in state.arcs
+                          for c in arc.ilabel))
+
+    def path(node):
+        inp = []
+        while parent[node] is not None:
+            node, symbol = parent[node]
+            inp.append(symbol)
+        return inp[::-1]
+
+    def differs(inp):
+        return run1.output(inp) != run2.output(inp)
+
+    start = (run1.initial, run2.initial)
+    parent = {start: None}
+    delays = {start: (0, ())}
+    if _ends_differently(run1, run2, start, delays[start]):
+        return False, []
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        if node == (None, None):
+            continue
+        for symbol in alphabet:
+            conf1, out1 = run1.step(node[0], symbol)
+            conf2, out2 = run2.step(node[1], symbol)
+            child = (conf1, conf2)
+            # The delay is irrelevant once an input is rejected
+            delay = None
+            if conf1 is not None and conf2 is not None:
+                delay = _combine_delay(delays[node], out1, out2)
+
+            if child in delays:
+                if delays[child] != delay:
+                    # Equivalent machines reach a product state with a single
+                    # delay, so an extension of one of the paths differs.
+                    witness = _resolve_conflict(run1, run2, alphabet,
+                                                path(child),
+                                                path(node) + [symbol],
+                                                differs)
+                    if witness is not None:
+                        return False, witness
+                continue
+
+            parent[child] = (node, symbol)
+            delays[child] = delay
+            if _ends_differently(run1, run2, child, delay):
+                return False, path(child)
+            queue.append(child)
+    return True, None
+
+
+def _resolve_conflict(run1, run2, alphabet, first, second, differs):
+    """
+    Given two inputs reaching the same pair of configurations with different
+    output delays, find an input on which the machines disagree. If both
+    machines accept some extension w from these configurations, one of
+    first + w, second + w is such an input.
+
+    Args:
+        run1 (_Runner): Runner of the first machine.
+        run2 (_Runner): Runner of the second machine.
+        alphabet (list): The input alphabet.
+        first (list): The first input.
+        second (list): The second input.
+        differs (function): Checks whether the machines disagree on an input.
+    Returns:
+        list: An input on which the machines disagree or None if the machines
+        reject all extensions of the inputs.
+    """
+    node = (run1.initial, run2.initial)
+    for symbol in first:
+        node = (run1.step(node[0], symbol)[0], run2.step(node[1], symbol)[0])
+
+    # Find the shortest extension which is accepted by both machines
+    parent = {node: None}
+    queue = deque([node])
+    while queue:
+        node = queue.popleft()
+        if run1.flush(node[0]) is not None and run2.flush(node[1]) is not None:
+            suffix = []
+            while parent[node] is not None:
+                node, symbol = parent[node]
+                suffix.append(symbol)
+            suffix.reverse()
+            for inp in [first + suffix, second + suffix]:
+                if differs(inp):
+                    return inp
+            return None
+        if node[0] is None or node[1] is None:
+            continue
+        for symbol in alphabet:
+            child = (run1.step(node[0], symbol)[0],
+                     run2.step(node[1], symbol)[0])
+            if child not in parent:
+                parent[child] = (node, symbol)
+                queue.append(child)
+    return None
+
+
+def _step_output(run2, config, olabel):
+    """
+    Args:
+        run2 (_Runner): Runner of the second machine of a pipeline.
+        config (tuple): Configuration of the second machine.
+        olabel (list): Output label of an arc of the first machine.
+    Returns:
+        tuple, list: The configuration reached by consuming the output and
+        the output produced.
+    """
+    out = []
+    for symbol in _output_tuple(olabel):
+        config, produced = run2.step(config, symbol)
+        out.extend(produced)
+    return config, out
+
+
+def _composed_arcs(transducer1, run2, state1, config2, arcs, path):
+    """
+    Compute the arcs of the composition for some arcs of a state of
+    transducer1. Every arc is taken by the composition if the input ends
+    after it or continues in a way which does not change the arcs taken by
+    transducer2, so it emits the output of transducer2 as if the input ended
+    there. If the lookahead of transducer2 is pending after the arc, the
+    arcs of the next state of transducer1 on which continuing is different
+    are added recursively, with the ilabel of the arc as a prefix.
+
+    Args:
+        transducer1 (Transducer): The first machine of the pipeline.
+        run2 (_Runner): Runner of the second machine of the pipeline.
+        state1 (int): State of transducer1.
+        config2 (tuple): Configuration of transducer2.
+        arcs (list): The arcs of state1 to compose.
+        path (set): The pairs of state and configuration the recursion went
+        through.
+    Returns:
+        list: The ilabel, output and pair of state of transducer1 and
+        configuration of transducer2 reached, of every arc.
+    """
+    composed_arcs = []
+    for arc in arcs:
+        config, out = _step_output(run2, config2, arc.olabel)
+        if config is None:
+            continue
+        final_config, final_out = run2.finish(config)
+        if final_config is not None:
+            composed_arcs.append((list(arc.ilabel), out + list(final_out),
+                                  (arc.nextstate, final_config)))
+        if not config[1]:
+            continue
+
+        # The arcs of the next state whose effect differs when the pending
+        # input of transducer2 is consumed together with their output.
+        next_arcs = _effective_arcs(transducer1[arc.nextstate])
+        extended = []
+        for next_arc in next_arcs:
+            config_a, out_a = _step_output(run2, config, next_arc.olabel)
+            if final_config is None:
+                same = config_a is None
+            else:
+                config_b, out_b = _step_output(run2, final_config,
+                                               next_arc.olabel)
+                same = config_a == config_b and \
+                        (config_a is None or list(final_out) + out_b == out_a)
+            if not same:
+                extended.append(next_arc)
+        if not extended:
+            continue
+        # Arcs longer than an extended one take precedence over it, so they
+        # must be extended as well.
+        extended = [next_arc for next_arc in next_arcs
+                    if any(_is_prefix(other.ilabel, next_arc.ilabel)
+                           for other in extended)]
+        if any(_is_prefix(arc.ilabel, other.ilabel) and
+               len(other.ilabel) > len(arc.ilabel)
+               for other in _effective_arcs(transducer1[state1])):
+            raise ValueError('Lookahead of the second transducer is pending '
+                             'after an arc of the first one which is a '
+                             'prefix of another arc')
+        node = (arc.nextstate, config)
+        if node in path:
+            raise ValueError('Lookahead of the second transducer is pending '
+                             'on a cycle of the first one')
+        for ilabel, next_out, child in _composed_arcs(
+                transducer1, run2, arc.nextstate, config, extended,
+                path | set([node])):
+            composed_arcs.append((list(arc.ilabel) + ilabel,
+                                  out + next_out, child))
+    return composed_arcs
+
+
+def _is_prefix(prefix, label):
+    """
+    Args:
+        prefix (list): A label.
+        label (list): Another label.
+    Returns:
+        bool: True if prefix is a prefix of label.
+    """
+    return list(label[:len(prefix)]) == list(prefix)
+
+
+def compose(transducer1, transducer2):
+    """
+    Return a transducer equivalent to running transducer2 on the output of
+    transducer1. The states of the composition are the pairs of states of the
+    two machines reachable from their initial states, so unreachable pairs
+    are never created. Every arc of the composition consumes the ilabel of an
+    arc of transducer1 and emits the output of transducer2 on its olabel.
+
+    The lookahead arcs of transducer1 are kept as they are. When the
+    lookahead of transducer2 is still pending after an arc of transducer1,
+    the arc emits the output of transducer2 as if the input ended there,
+    and lookahead arcs are added for the following arcs of transducer1 which
+    change the arcs taken by transducer2. A ValueError is raised if this is
+    not possible: if the extended arc of transducer1 is a prefix of another
+    arc of its state, which would take precedence differently in the
+    composition, or if the lookahead stays pending on a cycle of
+    transducer1, e.g. on arcs with empty outputs. Arcs of transducer1 whose
+    output is rejected by transducer2 are omitted, thus the composition
+    agrees with the pipeline on every input the pipeline accepts.
+
+    Args:
+        transducer1 (Transducer): The first machine of the pipeline.
+        transducer2 (Transducer): The second machine of the pipeline.
+    Returns:
+        Transducer: The composed machine.
+    """
+    run2 = _Runner(transducer2)
+    composed = Transducer()
+    start = (0, run2.initial)
+    ids = {start: 0}
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        src = ids[node]
+        state1, config2 = node
+        composed[src].final = transducer1[state1].final and \
+                transducer2[config2[0]].final
+        for ilabel, out, child in _composed_arcs(
+                transducer1, run2, state1, config2,
+                _effective_arcs(transducer1[state1]), set([])):
+            if child not in ids:
+                ids[child] = len(ids)
+                queue.append(child)
+            composed.add_arc(src, ids[child], ilabel, out or [EPSILON])
+    return composed
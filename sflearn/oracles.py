@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+"""
+This module contains equivalence oracles for the learning algorithms. An
+oracle searches for a counterexample by testing the hypothesis against the
+target on inputs derived from the structure of the hypothesis, and is
+typically used to implement the equivalence_query method of a learner:
+
+    def equivalence_query(self, hypothesis):
+        return self.oracle.find_counterexample(hypothesis)
+
+The outputs of the target are obtained through the query cache of the
+learner, so tests repeating earlier queries do not reach the target. Every
+oracle stops on the first counterexample found and performs at most budget
+tests in each call.
+"""
+
+import random
+from itertools import islice, product
+
+
+def _output_from(compiled, state, inp):
+    """
+    Run a compiled transducer on an input starting from a given state.
+
+    Args:
+        compiled (CompiledTransducer): The compiled machine.
+        state (int): Index of the state to start from.
+        inp (tuple): Input to the transducer.
+    Returns:
+        tuple: The output of the machine or None if the input is rejected.
+    """
+    out = []
+    i = 0
+    length = len(inp)
+    while i != length:
+        entry, matched = compiled.match(state, inp, i)
+        if entry is None:
+            return None
+        state = entry[0]
+        out.extend(entry[1])
+        i += matched
+    return tuple(out)
+
+
+def access_strings(hypothesis, alphabet):
+    """
+    Compute the shortest access string of every reachable state.
+
+    Args:
+        hypothesis (Transducer): The hypothesis machine.
+        alphabet (list): The input alphabet.
+    Returns:
+        dict: A map from state index to its access string.
+    """
+    table = hypothesis.compile().table
+    access = {0: ()}
+    queue = [0]
+    for state in queue:
+        for c in alphabet:
+            entry = table[state].get(c)
+            if entry is not None and entry[0] not in access:
+                access[entry[0]] = access[state] + (c,)
+                queue.append(entry[0])
+    return access
+
+
+def characterization_set(hypothesis, alphabet):
+    """
+    Compute a set of inputs distinguishing all the distinguishable states of
+    a hypothesis. The set is built by partition refinement: an input c + w,
+    where c is a symbol and w is already in the set or empty, is added when
+    it splits a block of states with equal outputs on the current set.
+
+    Args:
+        hypothesis (Transducer): The hypothesis machine.
+        alphabet (list): The input alphabet.
+    Returns:
+        list: The distinguishing inputs, as tuples, shortest first.
+    """
+    compiled = hypothesis.compile()
+    states = range(len(compiled.table))
+    blocks = [0] * len(states)
+    num_blocks = 1
+    dist = []
+    found = set([])
+    changed = True
+    while changed and num_blocks < len(states):
+        changed = False
+        for inp in [(c,) + w for w in [()] + dist for c in alphabet]:
+            if inp in found:
+                continue
+            ids = {}
+            new_blocks = [ids.setdefault(
+                (blocks[s], _output_from(compiled, s, inp)), len(ids))
+                          for s in states]
+            if len(ids) > num_blocks:
+                dist.append(inp)
+                found.add(inp)
+                blocks = new_blocks
+                num_blocks = len(ids)
+                changed = True
+                if num_blocks == len(states):
+                    break
+    return dist
+
+
+def identification_sets(hypothesis, dist):
+    """
+    Select for every state the inputs of a characterization set needed to
+    distinguish it from all the other states.
+
+    Args:
+        hypothesis (Transducer): The hypothesis machine.
+        dist (list): The characterization set of the hypothesis.
+    Returns:
+        list: The identification set of every state.
+    """
+    compiled = hypothesis.compile()
+    states = range(len(compiled.table))
+    outputs = [[_output_from(compiled, s, inp) for s in states]
+               for inp in dist]
+    id_sets = []
+    for s in states:
+        remaining = set(states)
+        remaining.discard(s)
+        id_set = []
+        for inp, outs in zip(dist, outputs):
+            separated = set(t for t in remaining if outs[t] != outs[s])
+            if separated:
+                id_set.append(inp)
+                remaining -= separated
+                if not remaining:
+                    break
+        id_sets.append(id_set)
+    return id_sets
+
+
+class _Oracle(object):
+
+    """
+    Base class of the oracles. Subclasses implement the _tests() generator.
+    """
+
+    def __init__(self, learner, budget=None, batch_size=1):
+        """
+        Args:
+            learner: The learner whose query cache and membership queries
+            are used to obtain the outputs of the target.
+            budget (int): Maximum number of tests in every call or None for
+            no limit.
+            batch_size (int): Number of tests sent to the target together.
+            Larger batches allow the queries to be batched or run in
+            parallel, at the cost of up to batch_size - 1 extra tests after
+            the counterexample.
+        """
+        self.learner = learner
+        self.budget = budget
+        self.batch_size = batch_size
+        self.tests = 0
+
+
+    def _tests(self, hypothesis):
+        """
+        Abstract method, it should generate the test inputs for the
+        hypothesis.
+
+        Args:
+            hypothesis (Transducer): The hypothesis to test.
+        Yields:
+            tuple: The test inputs.
+        """
+        raise NotImplementedError('Test generation is not implemented')
+
+
+    def find_counterexample(self, hypothesis):
+        """
+        Test the hypothesis against the target until a counterexample is
+        found or the budget is exhausted.
+
+        Args:
+            hypothesis (Transducer): The hypothesis to test.
+        Returns:
+            tuple(bool, list): True, None if no counterexample was found, or
+            False, ce where ce is an input where the hypothesis and target
+            machine disagree.
+        """
+        compiled = hypothesis.compile()
+        tests = self._tests(hypothesis)
+        self.tests = 0
+        while self.budget is None or self.tests < self.budget:
+            size = self.batch_size
+            if self.budget is not None:
+                size = min(size, self.budget - self.tests)
+            batch = list(islice(tests, size))
+            if not batch:
+                break
+            self.tests += len(batch)
+            outputs = self.learner.cached_membership_queries(batch)
+            for inp, out in zip(batch, outputs):
+                try:
+                    if compiled.consume_input(inp) == list(out):
+                        continue
+                except Exception:
+                    pass
+                return False, list(inp)
+        return True, None
+
+
+class RandomWalkOracle(_Oracle):
+    """
+    Oracle testing random walks on the hypothesis. Every step follows an arc
+    of the current state chosen uniformly, so the lookahead paths of the
+    hypothesis are tested as often as the single symbol transitions. A walk
+    ends with probability restart_probability after every step or when it
+    reaches max_length symbols.
+    """
+    def __init__(self, learner, budget=1000, restart_probability=0.1,
+                 max_length=100, seed=None, batch_size=1):
+        """
+        Args:
+            learner: The learner using the oracle.
+            budget (int): Maximum number of walks in every call.
+            restart_probability (float): Probability to end a walk after
+            every step.
+            max_length (int): Maximum length of a walk.
+            seed: Seed for the random number generator.
+            batch_size (int): Number of tests sent to the target together.
+        """
+        super(RandomWalkOracle, self).__init__(learner, budget, batch_size)
+        self.restart_probability = restart_probability
+        self.max_length = max_length
+        self.random = random.Random(seed)
+
+
+    def _tests(self, hypothesis):
+        states = hypothesis.states
+        while True:
+            inp = []
+            state = states[0]
+            while state.arcs and len(inp) < self.max_length:
+                arc = self.random.choice(state.arcs)
+                inp.extend(arc.ilabel)
+                state = states[arc.nextstate]
+                if self.random.random() < self.restart_probability:
+                    break
+            yield tuple(inp[:self.max_length])
+
+
+class WMethodOracle(_Oracle):
+    """
+    Oracle implementing the W-method. Every transition of the hypothesis is
+    reached through its access string, extended with every input of up to
+    depth symbols and followed by every input of a characterization set of
+    the hypothesis. If the target has at most depth more states than the
+    hypothesis, a correct hypothesis passes all the tests only if it is
+    equivalent to the target.
+    """
+    def __init__(self, learner, depth=1, budget=None, batch_size=1):
+        """
+        Args:
+            learner: The learner using the oracle.
+            depth (int): Maximum length of the inputs between the access
+            strings and the characterization set.
+            budget (int): Maximum number of tests in every call or None for
+            no limit.
+            batch_size (int): Number of tests sent to the target together.
+        """
+        super(WMethodOracle, self).__init__(learner, budget, batch_size)
+        self.depth = depth
+
+
+    def _middles(self):
+        """
+        Generate the inputs of up to depth symbols, shortest first.
+        """
+        for length in xrange(self.depth + 1):
+            for middle in product(self.learner.I, repeat=length):
+                yield middle
+
+
+    def _tests(self, hypothesis):
+        alphabet = self.learner.I
+        access = access_strings(hypothesis, alphabet)
+        cover = [access[s] for s in sorted(access)]
+        cover += [acc + (c,) for acc in cover for c in alphabet]
+        dist = characterization_set(hypothesis, alphabet) or [()]
+        seen = set([])
+        for middle in self._middles():
+            for acc in cover:
+                for suffix in dist:
+                    inp = acc + middle + suffix
+                    if inp not in seen:
+                        seen.add(inp)
+                        yield inp
+
+
+class WpMethodOracle(WMethodOracle):
+    """
+    Oracle implementing the Wp-method, a variant of the W-method requiring
+    fewer tests. The access strings of the states are followed by the whole
+    characterization set, while the remaining transitions are only followed
+    by the identification set of the state they lead to.
+    """
+
+    def _tests(self, hypothesis):
+        alphabet = self.learner.I
+        compiled = hypothesis.compile()
+        access = access_strings(hypothesis, alphabet)
+        states = [access[s] for s in sorted(access)]
+        dist = characterization_set(hypothesis, alphabet) or [()]
+        id_sets = identification_sets(hypothesis, dist)
+        seen = set([])
+        # Phase one: the states followed by the characterization set.
+        for middle in self._middles():
+            for acc in states:
+                for suffix in dist:
+                    inp = acc + middle + suffix
+                    if inp not in seen:
+                        seen.add(inp)
+                        yield inp
+        # Phase two: the transitions followed by the identification set of
+        # the state reached.
+        for middle in self._middles():
+            for acc in states:
+                for c in alphabet:
+                    prefix = acc + (c,) + middle
+                    state = compiled.run(prefix, len(prefix))
+                    for suffix in id_sets[state] or [()]:
+                        inp = prefix + suffix
+                        if inp not in seen:
+                            seen.add(inp)
+                            yield inp
+
+
+class RandomWpMethodOracle(_Oracle):
+    """
+    Randomized variant of the Wp-method. Every test is the access string of
+    a random state, followed by a random input of at least min_length
+    symbols and on average min_length + expected_length symbols, followed by
+    a random input from the identification set of the state reached or,
+    with probability one half, from the whole characterization set.
+    """
+    def __init__(self, learner, budget=1000, min_length=0,
+                 expected_length=3, seed=None, batch_size=1):
+        """
+        Args:
+            learner: The learner using the oracle.
+            budget (int): Maximum number of tests in every call.
+            min_length (int): Minimum length of the random middle inputs.
+            expected_length (int): Expected number of symbols of the middle
+            inputs on top of min_length.
+            seed: Seed for the random number generator.
+            batch_size (int): Number of tests sent to the target together.
+        """
+        super(RandomWpMethodOracle, self).__init__(learner, budget,
+                                                   batch_size)
+        self.min_length = min_length
+        self.expected_length = expected_length
+        self.random = random.Random(seed)
+
+
+    def _tests(self, hypothesis):
+        alphabet = self.learner.I
+        compiled = hypothesis.compile()
+        access = access_strings(hypothesis, alphabet)
+        states = [access[s] for s in sorted(access)]
+        dist = characterization_set(hypothesis, alphabet) or [()]
+        id_sets = identification_sets(hypothesis, dist)
+        stop = 1.0 / (self.expected_length + 1)
+        while True:
+            middle = [self.random.choice(alphabet)
+                      for _ in xrange(self.min_length)]
+            while self.random.random() > stop:
+                middle.append(self.random.choice(alphabet))
+            prefix = self.random.choice(states) + tuple(middle)
+            state = compiled.run(prefix, len(prefix))
+            if self.random.random() < 0.5 and id_sets[state]:
+                suffix = self.random.choice(id_sets[state])
+            else:
+                suffix = self.random.choice(dist)
+            yield prefix + suffix
@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+"""
+This module contains the QueryCache class, a cache for the membership queries
+of the learning algorithms. Queries are stored in a prefix trie, since the
+learning algorithms mostly query strings sharing long prefixes, such as the
+rows of the observation table extended by every column. The _CachedQueries
+mixin implements the membership queries of the learners through the cache,
+and the searches for counterexamples built on them.
+"""
+
+import logging
+
+
+class _TrieNode(object):
+
+    """
+    Node of the query trie. Nodes holding a cached output are also part of a
+    doubly linked list kept in least recently used order.
+    """
+
+    __slots__ = ('parent', 'symbol', 'children', 'output', 'prev', 'next')
+
+    def __init__(self, parent=None, symbol=None):
+        """
+        Args:
+            parent (_TrieNode): Parent node in the trie.
+            symbol (int): Input symbol leading from the parent to the node.
+        """
+        self.parent = parent
+        self.symbol = symbol
+        self.children = None
+        self.output = None
+        self.prev = None
+        self.next = None
+
+
+class QueryCache(object):
+    """
+    Cache of membership queries stored in a prefix trie. The cache can be
+    bounded in the number of cached queries and in the number of trie nodes,
+    in which case the least recently used queries are evicted. The hits,
+    misses and evictions attributes keep statistics about the cache usage.
+    """
+    def __init__(self, max_entries=None, max_nodes=None):
+        """
+        Args:
+            max_entries (int): Maximum number of cached queries or None for
+            no bound.
+            max_nodes (int): Maximum number of trie nodes, i.e. of distinct
+            prefixes of the cached queries, or None for no bound.
+        """
+        self.max_entries = max_entries
+        self.max_nodes = max_nodes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.clear()
+
+
+    def clear(self):
+        """
+        Remove all the cached queries. Statistics are not reset.
+        """
+        self._root = _TrieNode()
+        # Sentinel of the circular LRU list, its next node is the oldest.
+        self._lru = _TrieNode()
+        self._lru.prev = self._lru.next = self._lru
+        self._entries = 0
+        self._nodes = 1
+
+
+    def __len__(self):
+        """
+        Returns:
+            int: The number of cached queries.
+        """
+        return self._entries
+
+
+    @property
+    def nodes(self):
+        """
+        The number of nodes in the query trie.
+        """
+        return self._nodes
+
+
+    def _find(self, inp):
+        """
+        Args:
+            inp (list): Query input.
+        Returns:
+            _TrieNode: The node for the input or None if it is not in the trie.
+        """
+        node = self._root
+        for c in inp:
+            if node.children is None:
+                return None
+            node = node.children.get(c)
+            if node is None:
+                return None
+        return node
+
+
+    def _unlink(self, node):
+        node.prev.next = node.next
+        node.next.prev = node.prev
+
+
+    def _link(self, node):
+        # Append the node as the most recently used one.
+        node.prev = self._lru.prev
+        node.next = self._lru
+        self._lru.prev.next = node
+        self._lru.prev = node
+
+
+    def get(self, inp):
+        """
+        Return the cached output of a query.
+
+        Args:
+            inp (list): Query input.
+        Returns:
+            list: The cached output or None if the query is not cached.
+        """
+        node = self._find(inp)
+        if node is None or node.output is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._unlink(node)
+        self._link(node)
+        return list(node.output)
+
+
+    def __contains__(self, inp):
+        node = self._find(inp)
+        return node is not None and node.output is not None
+
+
+    def put(self, inp, out):
+        """
+        Cache the output of a query, evicting the least recently used queries
+        if the cache exceeds its bounds.
+
+        Args:
+            inp (list): Query input.
+            out (list): Query output.
+        """
+        node = self._root
+        for c in inp:
+            if node.children is None:
+                node.children = {}
+            child = node.children.get(c)
+            if child is None:
+                child = _TrieNode(node, c)
+                node.children[c] = child
+                self._nodes += 1
+            node = child
+        if node.output is None:
+            self._entries += 1
+        else:
+            self._unlink(node)
+        node.output = tuple(out)
+        self._link(node)
+        self._evict()
+
+
+    def _evict(self):
+        """
+        Evict the least recently used queries until the cache is within its
+        bounds. The most recently used query is never evicted.
+        """
+        while self._entries > 1 and \
+                ((self.max_entries is not None and
+                  self._entries > self.max_entries) or
+                 (self.max_nodes is not None and self._nodes > self.max_nodes)):
+            node = self._lru.next
+            self._unlink(node)
+            node.output = None
+            self._entries -= 1
+            self.evictions += 1
+            # Remove the branch of the trie which is no longer needed.
+            while node.parent is not None and node.output is None and \
+                    not node.children:
+                del node.parent.children[node.symbol]
+                self._nodes -= 1
+                node = node.parent
+
+
+    def items(self):
+        """
+        Iterate over the cached queries in order of increasing input length.
+
+        Yields:
+            tuple(tuple(int), list): The input and output of each query.
+        """
+        level = [((), self._root)]
+        while level:
+            next_level = []
+            for inp, node in level:
+                if node.output is not None:
+                    yield inp, list(node.output)
+                if node.children:
+                    for c, child in node.children.iteritems():
+                        next_level.append((inp + (c,), child))
+            level = next_level
+
+
+    def __getstate__(self):
+        """
+        The trie is pickled as the list of the cached queries in least
+        recently used order, instead of the deeply linked nodes.
+        """
+        entries = []
+        node = self._lru.next
+        while node is not self._lru:
+            inp = []
+            trie_node = node
+            while trie_node.parent is not None:
+                inp.append(trie_node.symbol)
+                trie_node = trie_node.parent
+            inp.reverse()
+            entries.append((tuple(inp), node.output))
+            node = node.next
+        return {'max_entries': self.max_entries, 'max_nodes': self.max_nodes,
+                'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'entries': entries}
+
+
+    def __setstate__(self, state):
+        self.max_entries = state['max_entries']
+        self.max_nodes = state['max_nodes']
+        self.hits = state['hits']
+        self.misses = state['misses']
+        self.evictions = state['evictions']
+        self.clear()
+        for inp, out in state['entries']:
+            self.put(inp, out)
+
+
+    def stats(self):
+        """
+        Returns:
+            dict: Statistics about the usage of the cache.
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'entries': self._entries,
+                'nodes': self._nodes}
+
+
+class _CachedQueries(object):
+
+    """
+    Implementation of the membership queries of the learners through their
+    query_cache, on top of the membership_query method and the executor
+    attribute, and of the replay of the cache and the shrinking of
+    counterexamples on the current _hypothesis.
+    """
+
+    def membership_queries(self, inputs):
+        """
+        Answer a batch of membership queries. The learning algorithm collects
+        all the independent queries of a step and issues them in a single
+        call, so targets with a high latency per query can override this
+        method to pipeline or batch them. By default every query is
+        forwarded to the membership_query method, through the executor of
+        the learner if one is set.
+
+        Args:
+            inputs (list): List of inputs for the target machine.
+        Returns:
+            list: Outputs of the target machine, in the order of inputs.
+        """
+        if self.executor is None or len(inputs) < 2:
+            return [self.membership_query(inp) for inp in inputs]
+        return self.executor.map(self.membership_query, inputs)
+
+
+    def cached_membership_query(self, inp):
+        """
+        Membership query through the query cache of the learner. Only queries
+        missing from the cache are forwarded to the membership_query method.
+        Equivalence queries can use it to test a hypothesis without repeating
+        the queries of the learning algorithm.
+
+        Args:
+            inp (list): Input for the target machine.
+        Returns:
+            list: Output of the target machine on input inp.
+        """
+        out = self.query_cache.get(inp)
+        if out is None:
+            out = self.membership_query(inp)
+            self.query_cache.put(inp, out)
+        return out
+
+
+    def cached_membership_queries(self, inputs):
+        """
+        Batched membership queries through the query cache of the learner.
+        Queries missing from the cache are deduplicated and forwarded in a
+        single call to the membership_queries method.
+
+        Args:
+            inputs (list): List of inputs for the target machine.
+        Returns:
+            list: Outputs of the target machine, in the order of inputs.
+        """
+        answers = {}
+        missing = []
+        for inp in inputs:
+            key = tuple(inp)
+            if key in answers:
+                continue
+            out = self.query_cache.get(key)
+            answers[key] = out
+            if out is None:
+                missing.append(key)
+        if missing:
+            logging.debug('Issuing %d batched membership queries.',
+                          len(missing))
+            for key, out in zip(missing, self.membership_queries(missing)):
+                self.query_cache.put(key, out)
+                answers[key] = out
+        return [answers[tuple(inp)] for inp in inputs]
+
+
+    def _replay_cache(self):
+        """
+        Run the cached membership queries in the hypothesis, shortest first,
+        looking for a counterexample which needs no queries to the target.
+        Cached queries with symbols outside the input alphabet I, which may
+        be left in a shared cache by other learners, are skipped. So are the
+        counterexamples on which processing did not change the hypothesis,
+        since returning them again would repeat the same round forever
+        instead of falling back to the equivalence query.
+
+        Returns:
+            list: An input where the hypothesis and the cached output of the
+            target machine disagree, or None if there is no such input.
+        """
+        compiled = self._hypothesis.compile()
+        machine = (compiled.table, compiled.tries)
+        alphabet = set(self.I)
+        items = self.query_cache.items()
+        if self.replay_sample is not None:
+            items = list(items)
+            if len(items) > self.replay_sample:
+                items = sorted(self._replay_random.sample(items,
+                                                          self.replay_sample),
+                               key=lambda item: len(item[0]))
+        for inp, out in items:
+            if inp in self._replayed or not alphabet.issuperset(inp):
+                continue
+            if compiled.consume_input(inp) != out:
+                if self._last_replay == (inp, machine):
+                    self._replayed.add(inp)
+                    continue
+                self._last_replay = (inp, machine)
+                return list(inp)
+        return None
+
+
+    def _is_counterexample(self, inp):
+        """
+        Check if the hypothesis and the target machine disagree on an input.
+
+        Args:
+            inp (list): Input to check.
+        Returns:
+            bool: True if the outputs differ and False otherwise.
+        """
+        return list(self._hypothesis.consume_input(inp)) != \
+                list(self.cached_membership_query(inp))
+
+
+    def _shrink_counterexample(self, ce):
+        """
+        Shrink a counterexample by removing parts of it, in the manner of the
+        delta debugging algorithm, for as long as the hypothesis and the
+        target machine still disagree on it. Shorter counterexamples add
+        fewer and shorter columns to the observation table.
+
+        Args:
+            ce (list): counterexample input
+        Returns:
+            list: A counterexample from which no single symbol can be removed.
+        """
+        ce = list(ce)
+        chunks = 2
+        while len(ce) > 1:
+            size = (len(ce) + chunks - 1) / chunks
+            for start in xrange(0, len(ce), size):
+                candidate = ce[:start] + ce[start + size:]
+                if candidate and self._is_counterexample(candidate):
+                    ce = candidate
+                    chunks = max(chunks - 1, 2)
+                    break
+            else:
+                if size == 1:
+                    break
+                chunks = min(chunks * 2, len(ce))
+        return ce
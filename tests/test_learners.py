@@ -0,0 +1,632 @@
+#!/usr/bin/env python
+
+import os
+import Queue
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+
+from sflearn import MealyMachineLearner, TransducerLearner, \
+    CE_SG, CE_RS, CE_ES, CE_LS, DiscriminationTreeLearner, ThreadPoolExecutor, ProcessPoolExecutor, \
+    AsyncMealyMachineLearner, AsyncTransducerLearner, RandomWalkOracle, \
+    WMethodOracle, WpMethodOracle, RandomWpMethodOracle, equivalent, minimize
+from sflearn.checkpoint import load_checkpoint
+from sflearn.observation_table import _ObservationTable
+from sflearn.oracles import access_strings, characterization_set, \
+    identification_sets
+from utils import random_mealy, all_inputs
+
+LEARNERS = [MealyMachineLearner, TransducerLearner, DiscriminationTreeLearner]
+
+
+def _learner(cls, target, symbols, **kwargs):
+    """
+    Create a learner of class cls answering its queries with a target
+    machine and its equivalence queries with the equivalent() operation.
+    """
+    class Learner(cls):
+        def membership_query(self, inp):
+            return target.consume_input(inp)
+
+        def equivalence_query(self, hypothesis):
+            return equivalent(hypothesis, target)
+
+    return Learner(range(symbols), logfile=os.devnull, **kwargs)
+
+
+def _learn(learner):
+    """
+    Run the learning loop of a learner.
+    """
+    if isinstance(learner, TransducerLearner):
+        return learner.learn_transducer()
+    return learner.learn_mealy_machine()
+
+
+def _arcs(machine):
+    """
+    Return the arcs of every state of a machine, for comparing machines.
+    """
+    return [[(arc.ilabel, arc.nextstate, arc.olabel) for arc in state.arcs]
+            for state in machine.states]
+
+
+class ObservationTableTest(unittest.TestCase):
+
+    def test_entries_and_closedness(self):
+        table = _ObservationTable([0, 1])
+        table.access_strings = [(), (0,)]
+        table.transitions = [(1,), (0, 0), (0, 1)]
+        rows = {(): [(), (1,)], (0,): [(2,), (1,)], (1,): [(2,), (1,)],
+                (0, 0): [(), (1,)], (0, 1): [(2,), (1,)]}
+        for row, outputs in rows.items():
+            for col, out in zip([(0,), (1,)], outputs):
+                table[row, col] = list(out)
+        self.assertEqual(table[(0,), (0,)], (2,))
+        self.assertEqual(table[(0,), (1, 1)], None)
+        self.assertEqual(table.is_closed(), (True, None))
+        self.assertEqual(table.equiv_classes,
+                         {(1,): (0,), (0, 0): (), (0, 1): (0,)})
+        # A new column and a changed row make a transition escape.
+        table[(0, 1), (1, 1)] = [5]
+        for row in rows:
+            if row != (0, 1):
+                table[row, (1, 1)] = []
+        self.assertEqual(table.is_closed(), (False, (0, 1)))
+        self.assertEqual(table[(0, 1), (1, 1)], (5,))
+        table.access_strings.append((0, 1))
+        self.assertEqual(table.is_closed(), (True, None))
+        self.assertEqual(table.equiv_classes[(0, 1)], (0, 1))
+
+
+    def test_mealy_machines(self):
+        for seed in xrange(30):
+            target = random_mealy(seed, states=6, symbols=3)
+            for cls in (MealyMachineLearner, TransducerLearner):
+                learner = _learner(cls, target, 3)
+                self.assertTrue(equivalent(_learn(learner), target)[0])
+
+
+    def test_lookahead_transducers(self):
+        for seed in xrange(30):
+            for lookaheads in (2, 4):
+                target = random_mealy(seed, states=5, symbols=3,
+                                      lookaheads=lookaheads)
+                learner = _learner(TransducerLearner, target, 3)
+                self.assertTrue(equivalent(_learn(learner), target)[0])
+
+
+class DiscriminationTreeTest(unittest.TestCase):
+
+    def test_random_machines(self):
+        for seed in xrange(40):
+            for states in (3, 8):
+                target = random_mealy(seed, states=states, symbols=3)
+                learner = _learner(DiscriminationTreeLearner, target, 3)
+                hypothesis = _learn(learner)
+                self.assertTrue(equivalent(hypothesis, target)[0])
+                # Every state of the tree is distinguished from the others.
+                self.assertEqual(len(hypothesis.states),
+                                 len(minimize(hypothesis).states))
+                self.assertEqual(len(hypothesis.states),
+                                 len(learner.access_strings))
+
+
+class BatchedQueriesTest(unittest.TestCase):
+
+    def _recording_learner(self, cls, target, **kwargs):
+        """
+        Create a learner which records every batch of queries to the target.
+        """
+        learner = _learner(cls, target, 3, **kwargs)
+        learner.batches = []
+        queries = learner.membership_queries
+
+        def membership_queries(inputs):
+            learner.batches.append(list(inputs))
+            return queries(inputs)
+
+        learner.membership_queries = membership_queries
+        return learner
+
+
+    def test_deduplicated(self):
+        target = random_mealy(0, symbols=3)
+        learner = self._recording_learner(MealyMachineLearner, target)
+        inputs = [[0, 1], [2], (0, 1), [], [2]]
+        self.assertEqual(learner.cached_membership_queries(inputs),
+                         [target.consume_input(inp) for inp in inputs])
+        self.assertEqual(learner.batches, [[(0, 1), (2,), ()]])
+        self.assertEqual(learner.cached_membership_queries(inputs[::-1]),
+                         [target.consume_input(inp) for inp in inputs[::-1]])
+        self.assertEqual(len(learner.batches), 1)
+
+
+    def test_learning(self):
+        for cls in LEARNERS:
+            for seed in xrange(10):
+                target = random_mealy(seed, states=6, symbols=3)
+                learner = self._recording_learner(cls, target)
+                self.assertTrue(equivalent(_learn(learner), target)[0])
+                queries = [tuple(inp) for batch in learner.batches
+                           for inp in batch]
+                # No query reaches the target twice.
+                self.assertEqual(len(set(queries)), len(queries))
+                self.assertTrue(len(learner.batches) < len(queries))
+
+
+class ExecutorTest(unittest.TestCase):
+
+    def test_map(self):
+        for executor in (ThreadPoolExecutor(4), ProcessPoolExecutor(2)):
+            try:
+                self.assertEqual(executor.map(abs, range(-50, 50)),
+                                 map(abs, range(-50, 50)))
+            finally:
+                executor.close()
+
+
+    def test_learning(self):
+        for executor in (ThreadPoolExecutor(4), ProcessPoolExecutor(2)):
+            try:
+                for cls in LEARNERS:
+                    for seed in xrange(3):
+                        target = random_mealy(seed, states=6, symbols=3)
+                        model = _learn(_learner(cls, target, 3))
+                        learner = _learner(cls, target, 3, executor=executor)
+                        hypothesis = _learn(learner)
+                        self.assertTrue(equivalent(hypothesis, target)[0])
+                        # The queries are answered in order, so the learned
+                        # machine is the same.
+                        self.assertEqual(_arcs(hypothesis), _arcs(model))
+            finally:
+                executor.close()
+
+
+class _EventLoop(object):
+    """
+    Thread answering the queries of the asynchronous learners in random
+    order, recording the number of queries in flight.
+    """
+    def __init__(self, target, failing=None):
+        self.target = target
+        self.failing = failing
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._queue = Queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.start()
+
+
+    def query(self, inp, callback):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self._queue.put((list(inp), callback))
+
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+    def _run(self):
+        rng = random.Random(0)
+        pending = []
+        while True:
+            # Collect every started query before completing one of them.
+            try:
+                item = self._queue.get(block=not pending)
+            except Queue.Empty:
+                inp, callback = pending.pop(rng.randrange(len(pending)))
+                with self._lock:
+                    self.in_flight -= 1
+                if inp == self.failing:
+                    callback(None, ValueError('query failed'))
+                else:
+                    callback(self.target.consume_input(inp))
+                continue
+            if item is None:
+                return
+            pending.append(item)
+
+
+def _async_learner(cls, target, loop, **kwargs):
+    """
+    Create an asynchronous learner of class cls answering its queries
+    through an event loop.
+    """
+    class Learner(cls):
+        def membership_query_async(self, inp, callback):
+            loop.query(inp, callback)
+
+        def equivalence_query(self, hypothesis):
+            return equivalent(hypothesis, target)
+
+    return Learner(range(3), logfile=os.devnull, **kwargs)
+
+
+class AsyncLearnerTest(unittest.TestCase):
+
+    def test_learning(self):
+        for cls, sync_cls in [(AsyncMealyMachineLearner, MealyMachineLearner),
+                              (AsyncTransducerLearner, TransducerLearner)]:
+            for seed in xrange(5):
+                target = random_mealy(seed, states=6, symbols=3)
+                loop = _EventLoop(target)
+                try:
+                    learner = _async_learner(cls, target, loop,
+                                             max_in_flight=4)
+                    hypothesis = _learn(learner)
+                finally:
+                    loop.close()
+                self.assertTrue(equivalent(hypothesis, target)[0])
+                self.assertEqual(_arcs(hypothesis),
+                                 _arcs(_learn(_learner(sync_cls, target, 3))))
+                self.assertTrue(loop.max_in_flight <= 4)
+
+
+    def test_errors(self):
+        target = random_mealy(0, symbols=3)
+        inputs = [[i, j] for i in xrange(3) for j in xrange(3)]
+        for cls in (AsyncMealyMachineLearner, AsyncTransducerLearner):
+            loop = _EventLoop(target, failing=[1, 1])
+            try:
+                learner = _async_learner(cls, target, loop, max_in_flight=3)
+                self.assertRaises(ValueError, learner.membership_queries,
+                                  inputs)
+                # No query is left running after the error.
+                self.assertEqual(loop.in_flight, 0)
+                self.assertEqual(learner.membership_queries(inputs[:4]),
+                                 [target.consume_input(inp)
+                                  for inp in inputs[:4]])
+            finally:
+                loop.close()
+
+            # Errors raised when starting a query are also propagated.
+            def membership_query_async(inp, callback):
+                raise KeyError(inp)
+
+            learner.membership_query_async = membership_query_async
+            self.assertRaises(KeyError, learner.membership_queries, inputs)
+
+
+class OracleTest(unittest.TestCase):
+
+    def test_characterization_sets(self):
+        for seed in xrange(30):
+            machine = minimize(random_mealy(seed, states=6, symbols=3))
+            compiled = machine.compile()
+            states = sorted(access_strings(machine, range(3)).values())
+            dist = characterization_set(machine, range(3))
+            id_sets = identification_sets(machine, dist)
+
+            def outputs(acc, suffixes):
+                return [compiled.consume_input(acc + suffix)[
+                    len(compiled.consume_input(acc)):] for suffix in suffixes]
+
+            for first in states:
+                for second in states:
+                    if first == second:
+                        continue
+                    first_id = compiled.run(first, len(first))
+                    self.assertNotEqual(outputs(first, dist),
+                                        outputs(second, dist))
+                    self.assertNotEqual(
+                        outputs(first, id_sets[first_id]),
+                        outputs(second, id_sets[first_id]))
+
+
+    def test_learning(self):
+        oracles = [lambda learner: WMethodOracle(learner, depth=3),
+                   lambda learner: WpMethodOracle(learner, depth=3),
+                   lambda learner: RandomWalkOracle(learner, seed=0),
+                   lambda learner: RandomWpMethodOracle(learner, seed=0,
+                                                        batch_size=16)]
+        for cls in LEARNERS:
+            for seed in xrange(5):
+                target = random_mealy(seed, symbols=3)
+                for oracle in oracles:
+                    learner = _learner(cls, target, 3)
+                    learner.equivalence_query = \
+                        oracle(learner).find_counterexample
+                    self.assertTrue(equivalent(_learn(learner), target)[0])
+
+
+class CounterexampleProcessingTest(unittest.TestCase):
+
+    def test_methods(self):
+        for seed in xrange(5):
+            target = random_mealy(seed, states=6, symbols=3)
+            for method in (CE_SG, CE_RS, CE_ES, CE_LS):
+                learner = _learner(MealyMachineLearner, target, 3,
+                                   ce_processing=method, replay_cache=False)
+                counterexamples = []
+                oracle = RandomWalkOracle(learner, seed=seed,
+                                          restart_probability=0.05)
+
+                def equivalence_query(hypothesis):
+                    found, ce = oracle.find_counterexample(hypothesis)
+                    if not found:
+                        counterexamples.append(ce)
+                    return found, ce
+
+                learner.equivalence_query = equivalence_query
+                self.assertTrue(equivalent(_learn(learner), target)[0])
+                stats = learner.ce_stats
+                self.assertEqual(stats['counterexamples'],
+                                 len(counterexamples))
+                self.assertTrue(stats['queries'] <= len(learner.query_cache))
+                if method == CE_SG:
+                    self.assertEqual(stats['probes'], 0)
+                else:
+                    self.assertTrue(stats['probes'] >=
+                                    stats['counterexamples'])
+
+
+    def test_unsupported_method(self):
+        self.assertRaises(NotImplementedError, _learner,
+                          MealyMachineLearner, random_mealy(0), 2,
+                          ce_processing=4)
+
+
+class ShrinkTest(unittest.TestCase):
+
+    def test_one_minimal(self):
+        rng = random.Random(0)
+        for seed in xrange(30):
+            target = random_mealy(seed, symbols=3)
+            learner = _learner(MealyMachineLearner, target, 3)
+            learner._hypothesis = random_mealy(seed + 1000, symbols=3)
+            ce = [rng.randrange(3) for _ in xrange(40)]
+            if not learner._is_counterexample(ce):
+                continue
+            shrunk = learner._shrink_counterexample(ce)
+            self.assertTrue(learner._is_counterexample(shrunk))
+            self.assertTrue(len(shrunk) <= len(ce))
+            for i in xrange(len(shrunk)):
+                candidate = shrunk[:i] + shrunk[i + 1:]
+                self.assertFalse(candidate and
+                                 learner._is_counterexample(candidate))
+
+
+    def test_learning(self):
+        for cls in (MealyMachineLearner, TransducerLearner):
+            for seed in xrange(5):
+                target = random_mealy(seed, states=6, symbols=3)
+                learner = _learner(cls, target, 3,
+                                   shrink_counterexamples=True)
+                oracle = RandomWalkOracle(learner, seed=seed)
+                learner.equivalence_query = oracle.find_counterexample
+                self.assertTrue(equivalent(_learn(learner), target)[0])
+
+
+class TraceTest(unittest.TestCase):
+
+    def test_run_in_hypothesis(self):
+        rng = random.Random(0)
+        for cls, lookaheads in [(MealyMachineLearner, 0),
+                                (TransducerLearner, 3)]:
+            for seed in xrange(10):
+                target = random_mealy(seed, states=6, symbols=3,
+                                      lookaheads=lookaheads)
+                learner = _learner(cls, target, 3)
+                _learn(learner)
+                compiled = learner._hypothesis.compile()
+                traces = []
+                trace = compiled.trace
+
+                def counted_trace(inp):
+                    traces.append(inp)
+                    return trace(inp)
+
+                compiled.trace = counted_trace
+                inp = [rng.randrange(3) for _ in xrange(30)]
+                for index in xrange(len(inp) + 1):
+                    state = compiled.run(inp, index)
+                    self.assertEqual(learner._run_in_hypothesis(inp, index),
+                                     learner.ot.access_strings[state])
+                # The states are computed once for the same input.
+                self.assertEqual(traces, [inp])
+                learner._run_in_hypothesis(list(inp), 0)
+                self.assertEqual(len(traces), 2)
+
+
+class TraceQueryTest(unittest.TestCase):
+
+    def test_native_trace_queries(self):
+        traced = 0
+        for seed in xrange(10):
+            target = random_mealy(seed, states=5, symbols=3, lookaheads=3)
+            model = _learn(_learner(TransducerLearner, target, 3))
+            learner = _learner(TransducerLearner, target, 3)
+            traces = []
+
+            def trace_query(inp):
+                traces.append(list(inp))
+                return [target.consume_input(inp[:i])
+                        for i in xrange(1, len(inp) + 1)]
+
+            learner.trace_query = trace_query
+            hypothesis = _learn(learner)
+            self.assertTrue(equivalent(hypothesis, target)[0])
+            self.assertEqual(_arcs(hypothesis), _arcs(model))
+            traced += len(traces)
+            for inp in traces:
+                for i in xrange(1, len(inp) + 1):
+                    self.assertTrue(inp[:i] in learner.query_cache)
+
+            # Traces with all their prefixes cached do not reach the target.
+            del traces[:]
+            inp = [0, 1, 2, 0]
+            expected = [target.consume_input(inp[:i]) for i in xrange(1, 5)]
+            self.assertEqual(learner._trace_query(inp), expected)
+            self.assertEqual(learner._trace_query(inp), expected)
+            self.assertTrue(len(traces) <= 1)
+        self.assertTrue(traced > 0)
+
+
+class _Crash(Exception):
+    pass
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'learner.ckpt')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def test_resume(self):
+        for cls in (MealyMachineLearner, TransducerLearner):
+            for seed in xrange(5):
+                target = random_mealy(seed, states=6, symbols=3)
+                learner = _learner(cls, target, 3)
+                model = _learn(learner)
+                limit = [len(learner.query_cache) / 2]
+                queries = []
+
+                def membership_query(inp):
+                    if len(queries) == limit[0]:
+                        raise _Crash()
+                    queries.append(tuple(inp))
+                    return target.consume_input(inp)
+
+                # Crash the learner in the middle of learning.
+                learner = _learner(cls, target, 3,
+                                   checkpoint_file=self.filename)
+                learner.membership_query = membership_query
+                self.assertRaises(_Crash, _learn, learner)
+                cache = load_checkpoint(self.filename)['query_cache']
+                saved = set(inp for inp, _ in cache.items())
+                self.assertTrue(saved)
+
+                learner = _learner(cls, target, 3)
+                learner.membership_query = membership_query
+                limit[0] = None
+                del queries[:]
+                hypothesis = learner.resume(self.filename)
+                self.assertTrue(equivalent(hypothesis, target)[0])
+                self.assertEqual(_arcs(hypothesis), _arcs(model))
+                # No query answered before the checkpoint is repeated.
+                self.assertFalse(saved.intersection(queries))
+                self.assertEqual(learner.checkpoint_file, self.filename)
+
+
+    def test_invalid_checkpoints(self):
+        target = random_mealy(0, symbols=3)
+        learner = _learner(MealyMachineLearner, target, 3,
+                           checkpoint_file=self.filename)
+        _learn(learner)
+        other = _learner(MealyMachineLearner, target, 2)
+        self.assertRaises(ValueError, other.resume, self.filename)
+        with open(self.filename, 'wb') as f:
+            f.write('not a checkpoint')
+        self.assertRaises(ValueError, learner.resume, self.filename)
+
+
+class HypothesisTest(unittest.TestCase):
+
+    def test_hypotheses_are_not_modified(self):
+        # Every equivalence query gets a hypothesis which later rounds leave
+        # untouched, although they reuse its arcs.
+        inputs = list(all_inputs(3, 4))
+        for cls in LEARNERS:
+            lookaheads = 2 if cls is TransducerLearner else 0
+            for seed in xrange(10):
+                target = random_mealy(seed, states=6, symbols=3,
+                                      lookaheads=lookaheads)
+                learner = _learner(cls, target, 3, replay_cache=False)
+                hypotheses = []
+                query = learner.equivalence_query
+
+                def equivalence_query(hypothesis):
+                    hypotheses.append((hypothesis, [
+                        hypothesis.consume_input(inp) for inp in inputs]))
+                    return query(hypothesis)
+
+                learner.equivalence_query = equivalence_query
+                self.assertTrue(equivalent(_learn(learner), target)[0])
+                for hypothesis, outputs in hypotheses:
+                    self.assertEqual([hypothesis.consume_input(inp)
+                                      for inp in inputs], outputs)
+                self.assertEqual(len(set(id(h) for h, _ in hypotheses)),
+                                 len(hypotheses))
+
+
+class ReplayTest(unittest.TestCase):
+
+    def _counting_learner(self, cls, target, **kwargs):
+        """
+        Create a learner which counts its equivalence queries.
+        """
+        learner = _learner(cls, target, 3, **kwargs)
+        learner.rounds = 0
+        query = learner.equivalence_query
+
+        def equivalence_query(hypothesis):
+            learner.rounds += 1
+            return query(hypothesis)
+
+        learner.equivalence_query = equivalence_query
+        return learner
+
+
+    def test_shared_cache(self):
+        for cls in LEARNERS:
+            for seed in xrange(10):
+                target = random_mealy(seed, states=6, symbols=3)
+                first = self._counting_learner(cls, target)
+                _learn(first)
+                # Queries with symbols outside the alphabet are skipped.
+                first.query_cache.put([7, 0], [1])
+                for sample in (None, 5):
+                    second = self._counting_learner(
+                        cls, target, query_cache=first.query_cache,
+                        replay_sample=sample)
+                    self.assertTrue(equivalent(_learn(second), target)[0])
+                    self.assertTrue(second.rounds <= first.rounds)
+                    if sample is None:
+                        self.assertEqual(second.rounds, 1)
+
+
+    def test_counterexample_without_refinement(self):
+        # A wrong cached output, which processing cannot explain, must not
+        # be replayed forever in place of the equivalence query.
+        for cls in LEARNERS:
+            for seed in xrange(5):
+                target = random_mealy(seed, symbols=3)
+                learner = _learner(cls, target, 3)
+                planted = [0] * 40
+                learner.query_cache.put(planted,
+                                        target.consume_input(planted) + [1])
+                processed = []
+
+                def wrap(process):
+                    def process_counterexample(ce):
+                        if ce != planted:
+                            return process(ce)
+                        processed.append(ce)
+                        self.assertEqual(len(processed), 1)
+                        return False
+                    return process_counterexample
+
+                if cls is MealyMachineLearner:
+                    learner.process_counterexample = \
+                        wrap(learner.process_counterexample)
+                else:
+                    learner._process_counterexample = \
+                        wrap(learner._process_counterexample)
+                self.assertTrue(equivalent(_learn(learner), target)[0])
+                self.assertEqual(processed, [planted])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+import unittest
+
+from sflearn import Transducer, EPSILON, minimize, equivalent, compose
+from utils import random_mealy, same_outputs, all_inputs
+
+
+def _unrolled(machine):
+    """
+    Build an equivalent machine with two copies of every state, alternating
+    between the copies on every arc.
+    """
+    size = len(machine.states)
+    unrolled = Transducer()
+    for state in machine.states:
+        for arc in state.arcs:
+            for copy in (0, 1):
+                unrolled.add_arc(state.stateid + copy * size,
+                                 arc.nextstate + (1 - copy) * size,
+                                 arc.ilabel, arc.olabel)
+    return unrolled
+
+
+class MinimizeTest(unittest.TestCase):
+
+    def test_entering_labels_split_blocks(self):
+        # States 1 and 2 only differ in the states they move to on input 1.
+        machine = Transducer()
+        for src, c, dst, out in [(0, 0, 2, [EPSILON]), (0, 1, 0, [1, 0]),
+                                 (1, 0, 1, [1]), (1, 1, 3, [1]),
+                                 (2, 0, 1, [1]), (2, 1, 0, [1]),
+                                 (3, 0, 0, [EPSILON]), (3, 1, 3, [EPSILON])]:
+            machine.add_arc(src, dst, [c], out)
+        minimal = minimize(machine)
+        self.assertEqual(minimal.consume_input([0, 0, 1, 1]), [1, 1])
+        self.assertTrue(equivalent(machine, minimal)[0])
+
+
+    def test_random_machines(self):
+        for seed in xrange(300):
+            machine = random_mealy(seed)
+            minimal = minimize(machine)
+            self.assertTrue(equivalent(machine, minimal)[0], seed)
+            self.assertIsNone(same_outputs(machine, minimal, 2, 8), seed)
+            self.assertLessEqual(len(minimal.states), len(machine.states))
+
+
+    def test_random_lookahead_machines(self):
+        for seed in xrange(100):
+            machine = random_mealy(seed, lookaheads=3)
+            minimal = minimize(machine)
+            self.assertTrue(equivalent(machine, minimal)[0], seed)
+            self.assertIsNone(same_outputs(machine, minimal, 2, 7), seed)
+
+
+class EquivalentTest(unittest.TestCase):
+
+    def test_random_pairs(self):
+        for seed in xrange(300):
+            first = random_mealy(seed, states=2)
+            second = random_mealy(seed + 1000, states=2)
+            equal, inp = equivalent(first, second)
+            expected = same_outputs(first, second, 2, 8)
+            if expected is None:
+                self.assertTrue(equal, seed)
+            else:
+                # The distinguishing input has the minimal length.
+                self.assertFalse(equal, seed)
+                self.assertNotEqual(first.consume_input(inp),
+                                    second.consume_input(inp))
+                self.assertEqual(len(inp), len(expected))
+
+
+    def test_equivalent_machines(self):
+        for seed in xrange(100):
+            machine = random_mealy(seed, lookaheads=seed % 3)
+            self.assertEqual(equivalent(machine, _unrolled(machine)),
+                             (True, None), seed)
+
+
+class ComposeTest(unittest.TestCase):
+
+    def _check(self, first, second, seed):
+        composed = compose(first, second)
+        for inp in all_inputs(2, 7):
+            self.assertEqual(composed.consume_input(inp),
+                             second.consume_input(first.consume_input(inp)),
+                             (seed, inp))
+
+
+    def _machine(self, arcs):
+        machine = Transducer()
+        for src, inp, dst, out in arcs:
+            machine.add_arc(src, dst, inp, out)
+        return machine
+
+
+    def test_random_pipelines(self):
+        for seed in xrange(100):
+            first = random_mealy(seed, lookaheads=seed % 3)
+            second = random_mealy(seed + 1000, symbols=3)
+            self._check(first, second, seed)
+
+
+    def test_lookahead_second_machine(self):
+        # Every arc of the first machine outputs a single symbol, so the
+        # lookahead of the second one spans several of its arcs.
+        for seed in xrange(100):
+            first = random_mealy(seed)
+            for state in first.states:
+                for arc in state.arcs:
+                    arc.olabel = [(seed + arc.nextstate) % 3]
+            second = random_mealy(seed + 1000, symbols=3, lookaheads=3)
+            self._check(first, second, seed)
+
+
+    def test_rejected_pipelines(self):
+        second = self._machine([(0, [0], 0, [1]), (0, [0, 0], 0, [2]),
+                                (0, [1], 0, [1])])
+        # The lookahead stays pending while the first machine loops on 1.
+        first = self._machine([(0, [0], 0, [0]), (0, [1], 0, [EPSILON])])
+        self.assertRaises(ValueError, compose, first, second)
+        # The arc on 0 leaving the lookahead pending is a prefix of another.
+        first = self._machine([(0, [0], 0, [0]), (0, [1], 0, [1]),
+                               (0, [0, 1], 0, [1])])
+        self.assertRaises(ValueError, compose, first, second)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+import cPickle
+import random
+import unittest
+
+from sflearn import QueryCache, equivalent
+from utils import random_mealy, all_inputs
+from test_learners import LEARNERS, _learner, _learn
+
+
+class QueryCacheTest(unittest.TestCase):
+
+    def test_least_recently_used(self):
+        cache = QueryCache(max_entries=3)
+        for inp in ([0], [1], [0, 1]):
+            cache.put(inp, inp)
+        self.assertEqual(cache.get([0]), [0])
+        cache.put([1, 1], [2])
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.evictions, 1)
+        self.assertFalse([1] in cache)
+        for inp in ([0], [0, 1], [1, 1]):
+            self.assertTrue(inp in cache)
+        self.assertEqual(cache.get([1]), None)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
+    def test_node_bound(self):
+        rng = random.Random(0)
+        cache = QueryCache(max_nodes=50)
+        for _ in xrange(500):
+            inp = [rng.randrange(3) for _ in xrange(rng.randrange(1, 12))]
+            cache.put(inp, inp[::-1])
+            self.assertTrue(cache.nodes <= 50 or len(cache) == 1)
+            self.assertEqual(cache.get(inp), inp[::-1])
+            # The trie holds exactly the prefixes of the cached queries.
+            prefixes = set(inp[:i] for inp, _ in cache.items()
+                           for i in xrange(len(inp) + 1))
+            self.assertEqual(cache.nodes, len(prefixes))
+        self.assertTrue(cache.evictions > 0)
+
+
+    def test_pickle(self):
+        cache = QueryCache(max_entries=20)
+        for inp in all_inputs(2, 5):
+            cache.put(inp, inp + [0])
+        cache.get([1, 1, 1, 1, 0])
+        for protocol in xrange(cPickle.HIGHEST_PROTOCOL + 1):
+            copy = cPickle.loads(cPickle.dumps(cache, protocol))
+            self.assertEqual(sorted(copy.items()), sorted(cache.items()))
+            self.assertEqual(copy.stats(), cache.stats())
+            # The least recently used order is kept.
+            copy.put([2], [2])
+            cache.put([2], [2])
+            self.assertEqual(sorted(copy.items()), sorted(cache.items()))
+
+
+class CachedLearningTest(unittest.TestCase):
+
+    def test_bounded_caches(self):
+        for cls in LEARNERS:
+            for seed in xrange(10):
+                target = random_mealy(seed, states=5, symbols=3)
+                for cache in (QueryCache(), QueryCache(max_entries=10),
+                              QueryCache(max_nodes=30)):
+                    learner = _learner(cls, target, 3, query_cache=cache)
+                    self.assertTrue(equivalent(_learn(learner), target)[0])
+                    self.assertEqual(
+                        learner.cached_membership_query([0, 1, 2]),
+                        target.consume_input([0, 1, 2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
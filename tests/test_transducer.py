@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+import cPickle
+import os
+import random
+import tempfile
+import unittest
+
+from sflearn import Transducer, CompactTransducer, PythonProgram, \
+    save_binary, load_binary
+from utils import random_mealy, all_inputs
+
+
+def _cases(count=20):
+    """
+    Generate random machines, with and without lookahead arcs, together with
+    all their short inputs, random long inputs and the outputs of
+    consume_input() on them.
+    """
+    for seed in xrange(count):
+        for lookaheads in (0, 4):
+            machine = random_mealy(seed, symbols=3, lookaheads=lookaheads)
+            rng = random.Random(seed)
+            inputs = list(all_inputs(3, 5))
+            inputs += [[rng.randrange(3) for _ in xrange(rng.randrange(60))]
+                       for _ in xrange(50)]
+            yield machine, inputs, [machine.consume_input(inp)
+                                    for inp in inputs]
+
+
+class ConsumeManyTest(unittest.TestCase):
+
+    def _check(self, machine, inputs, expected, **kwargs):
+        outputs, offsets = machine.consume_many(inputs, **kwargs)
+        self.assertEqual([list(outputs[offsets[k]:offsets[k + 1]])
+                          for k in xrange(len(inputs))], expected)
+
+
+    def test_random_machines(self):
+        for machine, inputs, expected in _cases():
+            self._check(machine, inputs, expected)
+            self._check(machine, inputs[::-1], expected[::-1], batch_size=64)
+
+
+    def test_max_cells(self):
+        # The longest inputs do not fit in a batch and are run one at a time.
+        for machine, inputs, expected in _cases(5):
+            self._check(machine, inputs, expected, max_cells=40 * 32)
+
+
+class StreamTest(unittest.TestCase):
+
+    def test_random_machines(self):
+        for machine, inputs, expected in _cases():
+            for inp, out in zip(inputs, expected):
+                chunks = [inp[:1], [], inp[1:4], inp[4:]]
+                self.assertEqual(sum(machine.stream(chunks), []), out, inp)
+
+
+class CompactTransducerTest(unittest.TestCase):
+
+    def test_random_machines(self):
+        for machine, inputs, expected in _cases():
+            compact = CompactTransducer.from_transducer(machine)
+            self.assertEqual([compact.consume_input(inp) for inp in inputs],
+                             expected)
+
+
+class PickleTest(unittest.TestCase):
+
+    def test_all_protocols(self):
+        for machine, inputs, expected in _cases(5):
+            for protocol in xrange(cPickle.HIGHEST_PROTOCOL + 1):
+                for cls in (Transducer, CompactTransducer):
+                    if cls is Transducer:
+                        original = machine
+                    else:
+                        original = CompactTransducer.from_transducer(machine)
+                    copy = cPickle.loads(cPickle.dumps(original, protocol))
+                    self.assertEqual([copy.consume_input(inp)
+                                      for inp in inputs], expected)
+
+
+class BinaryTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        handle, filename = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            for machine, inputs, expected in _cases():
+                save_binary(machine, filename)
+                mapped = load_binary(filename)
+                self.assertEqual([mapped.consume_input(inp)
+                                  for inp in inputs], expected)
+                mapped.close()
+        finally:
+            os.remove(filename)
+
+
+class PythonProgramTest(unittest.TestCase):
+
+    def test_random_machines(self):
+        for machine, inputs, expected in _cases():
+            program = PythonProgram()
+            program.create_from_transducer(machine)
+            function = program.compile()
+            self.assertEqual([list(function(inp)) for inp in inputs],
+                             expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
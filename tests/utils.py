@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Helpers for the tests: random small machines and brute force enumeration of
+their inputs.
+"""
+
+import random
+from itertools import product
+
+from sflearn import Transducer, EPSILON
+
+OUTPUTS = [[EPSILON], [0], [1], [1, 0], [2, 2]]
+
+
+def random_mealy(seed, states=4, symbols=2, lookaheads=0):
+    """
+    Generate a random transducer with a transition for every state and input
+    symbol.
+
+    Args:
+        seed (int): Seed for the random number generator.
+        states (int): Number of states.
+        symbols (int): Size of the input alphabet, the symbols 0 to symbols-1.
+        lookaheads (int): Number of lookahead arcs with two symbol inputs.
+    Returns:
+        Transducer: The random machine.
+    """
+    rng = random.Random(seed)
+    machine = Transducer()
+    for src in xrange(states):
+        for c in xrange(symbols):
+            machine.add_arc(src, rng.randrange(states), [c],
+                            list(rng.choice(OUTPUTS)))
+    for _ in xrange(lookaheads):
+        machine.add_arc(rng.randrange(states), rng.randrange(states),
+                        [rng.randrange(symbols), rng.randrange(symbols)],
+                        list(rng.choice(OUTPUTS)))
+    return machine
+
+
+def all_inputs(symbols, max_length):
+    """
+    Generate every input of up to max_length symbols, shortest first.
+
+    Args:
+        symbols (int): Size of the input alphabet.
+        max_length (int): Maximum input length.
+    Yields:
+        list: The inputs.
+    """
+    for length in xrange(max_length + 1):
+        for inp in product(range(symbols), repeat=length):
+            yield list(inp)
+
+
+def same_outputs(first, second, symbols, max_length):
+    """
+    Check if two machines produce the same outputs on every input of up to
+    max_length symbols.
+
+    Returns:
+        list: The first input with different outputs or None.
+    """
+    for inp in all_inputs(symbols, max_length):
+        if first.consume_input(inp) != second.consume_input(inp):
+            return inp
+    return None